@@ -0,0 +1,470 @@
+"""Benchmarks for the news notification pipeline (score_and_notify.py).
+
+Stages are timed separately on a reproducible synthetic corpus: headline
+scoring, age scoring, fuzzy dedup and reject checks, state load/save on a
+scaled-up state, and full dry-run main() runs against a local RSS server.
+Results are printed and optionally written as JSON, so two branches can be
+compared on the same --seed.
+
+Usage:
+    python .github/scripts/benchmark_notifications.py [--count 20000] [--json results.json]
+    python .github/scripts/benchmark_notifications.py --count 1000000 --state-scale 100 --feed-items 2000
+    python .github/scripts/benchmark_notifications.py --import-time
+"""
+import argparse
+import contextlib
+import datetime
+import email.utils
+import http.server
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import score_and_notify as notifier
+from script_patching import patched
+
+DRIVERS = [
+    "Verstappen", "Norris", "Piastri", "Leclerc", "Hamilton", "Russell", "Antonelli", "Alonso",
+    "Stroll", "Gasly", "Colapinto", "Albon", "Sainz", "Hadjar", "Lawson", "Bearman", "Ocon",
+    "Hulkenberg", "Bortoleto", "Tsunoda",
+]
+TEAMS = [
+    "Red Bull", "McLaren", "Ferrari", "Mercedes", "Aston Martin", "Alpine", "Williams",
+    "Racing Bulls", "Sauber", "Haas", "Cadillac", "Audi",
+]
+EVENTS = [
+    "Australian GP", "Bahrain Grand Prix", "Monaco GP", "British Grand Prix", "Japanese GP",
+    "Italian Grand Prix", "Singapore GP", "Las Vegas Grand Prix", "Abu Dhabi GP", "Belgian GP",
+]
+TEMPLATES = [
+    "{driver} wins the {event}",
+    "{driver} takes pole position for the {event}",
+    "{driver} crash brings out red flag in FP2 at {event}",
+    "{team} confirms {driver} for 2027 with new contract",
+    "{driver} handed five-second penalty after {event} collision",
+    "How {team} turned its season around",
+    "Why {driver} could still win the title",
+    "{team} reveals 2026 car livery",
+    "{driver} fastest in qualifying as {team} struggles",
+    "{team} team principal leaves after {event}",
+    "{driver} admits {team} upgrade has not worked",
+    "F1 {event} practice: {driver} tops FP1",
+    "{driver} slams stewards after {event} investigation",
+    "Top 10 moments from the {event}",
+    "{team} brings floor and wing upgrade package to {event}",
+    "Rumours link {driver} with {team} seat",
+    "{driver} reacts to {team} strategy mistake",
+    "Sprint race report: {driver} wins at {event}",
+    "The {event} as it happened",
+    "{driver} says {team} pace is a concern",
+]
+
+
+def generate_headlines(count, seed=2026):
+    """Reproducible corpus of F1-style headlines"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(driver=rng.choice(DRIVERS), team=rng.choice(TEAMS), event=rng.choice(EVENTS))
+        for _ in range(count)
+    ]
+
+
+def generate_rss_items(count, seed=2026, now=None):
+    """`count` RSS <item> elements, newest first, 20 minutes apart"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    rng = random.Random(seed)
+    items = []
+    for i, title in enumerate(generate_headlines(count, seed)):
+        published = now - datetime.timedelta(minutes=20 * i + rng.randint(0, 10))
+        link = f"https://example.com/f1/news/{seed}-{i}/"
+        items.append(
+            f"<item><title>{escape(title)}</title><link>{link}</link><guid>{link}</guid>"
+            f"<pubDate>{email.utils.format_datetime(published)}</pubDate>"
+            f"<description>{escape(title)}. Full story inside.</description>"
+            f'<enclosure url="https://img.example.com/{seed}-{i}.jpg" type="image/jpeg"/></item>'
+        )
+    return items
+
+
+def generate_rss(count, seed=2026, now=None, items=None):
+    """RSS 2.0 document (`items` if given, else `count` generated ones)"""
+    items = generate_rss_items(count, seed, now) if items is None else items
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>F1 News</title>'
+            + "".join(items) + "</channel></rss>")
+
+
+# Section sizes of the production state when this benchmark was added;
+# --state-scale multiplies them (ignored_items stops at its ring capacity).
+BASELINE_STATE_SIZES = {
+    'nuclear_sent': 5,
+    'nuclear_queue': 2,
+    'major_sent': 50,
+    'digest_items': 16,
+    'ignored_items': 1591,
+    'sent_urls': 54,
+    'title_fingerprints': 55,
+    'gemini_cache': 20,
+    'outbox': 2,
+}
+
+
+def build_scaled_state(scale, seed=2026, now=None):
+    """State fields with every section BASELINE_STATE_SIZES * scale records long"""
+    now = now or datetime.datetime.utcnow()
+    rng = random.Random(seed)
+    sizes = {section: count * scale for section, count in BASELINE_STATE_SIZES.items()}
+    titles = generate_headlines(max(sizes.values()), seed)
+
+    def headline(i):
+        timestamp = (now - datetime.timedelta(minutes=rng.randint(0, 30 * 24 * 60))).replace(microsecond=0)
+        title = f"{titles[i]} ({i})"
+        return {
+            "id": notifier.generate_id(title, timestamp.isoformat()),
+            "title": title,
+            "url": f"https://example.com/f1/news/{seed}-{i}/",
+            "score": rng.randint(notifier.DIGEST_THRESHOLD, 130),
+            "timestamp": timestamp.isoformat(),
+            "ts": notifier.to_epoch(timestamp),
+            "image": None,
+        }
+
+    state = notifier.create_default_state()
+    state['date'] = now.strftime('%Y-%m-%d')
+    for section in ('nuclear_sent', 'nuclear_queue', 'major_sent', 'digest_items'):
+        state[section] = [headline(i) for i in range(sizes[section])]
+    state['sent_urls'] = [{"id": f"https://example.com/f1/news/{seed}-{i}/", "count": 1} for i in range(sizes['sent_urls'])]
+    state['title_fingerprints'] = [
+        notifier.create_title_fingerprint(item['title'], item['timestamp'])
+        for item in (headline(i) for i in range(sizes['title_fingerprints']))
+    ]
+    state['ignored_items'] = [headline(i)['id'] for i in range(min(sizes['ignored_items'], notifier.IGNORED_ITEMS_CAP))]
+    now_epoch = notifier.to_epoch(now)
+    state['gemini_cache'] = [
+        {"id": f"{i:032x}", "ts": now_epoch - rng.randint(0, 72 * 3600),
+         "verdict": {"confirmed": bool(i % 2), "reason": "Synthetic verdict", "demote_to": "major"}}
+        for i in range(sizes['gemini_cache'])
+    ]
+    state['outbox'] = [
+        {"id": f"major:{item['id']}", "kind": "major", "item": item,
+         "message": {"title": "F1 News", "body": item['title'], "data": {"type": "major"}, "priority": "high",
+                     "channel_id": "f1_major", "image_url": None},
+         "attempts": 1, "created": now_epoch, "next_retry": now_epoch + 3600}
+        for item in (headline(i) for i in range(sizes['outbox']))
+    ]
+    return state
+
+
+def load_state_headlines():
+    """Real headlines already recorded in the notification state"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = notifier.load_state()
+    items = state.get('nuclear_sent', []) + state.get('major_sent', []) + state.get('digest_items', [])
+    return [item['title'] for item in items if item.get('title')]
+
+
+def legacy_score_headline(title):
+    """Reference implementation: one re.search per pattern (pre-CompiledScorer behaviour)"""
+    for pattern in notifier.NUCLEAR_PATTERNS:
+        if re.search(pattern, title, re.IGNORECASE):
+            for disq_pattern in notifier.NUCLEAR_DISQUALIFIERS:
+                if re.search(disq_pattern, title, re.IGNORECASE):
+                    break
+            else:
+                return notifier.NUCLEAR_SCORE, "nuclear"
+
+    score = 0
+    for table in (notifier.MAJOR_PATTERNS, notifier.MEDIUM_PATTERNS, notifier.BROAD_PATTERNS, notifier.NEGATIVE_PATTERNS):
+        for points, pattern in table:
+            if re.search(pattern, title, re.IGNORECASE):
+                score += points
+
+    if score >= notifier.MAJOR_THRESHOLD:
+        return score, "major"
+    if score >= notifier.DIGEST_THRESHOLD:
+        return score, "digest"
+    return score, "ignore"
+
+
+def time_per_item(func, corpus, repeat=3):
+    """Best-of-N wall time per item, in microseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for title in corpus:
+            func(title)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(corpus) * 1e6
+
+
+def bench_scoring(corpus):
+    """Compare CompiledScorer against the legacy loop and verify identical results"""
+    mismatches = [t for t in corpus if notifier.SCORER.score(t) != legacy_score_headline(t)]
+    if mismatches:
+        raise AssertionError(f"CompiledScorer disagrees with legacy scoring on {len(mismatches)} headlines, e.g. {mismatches[0]!r}")
+
+    legacy_us = time_per_item(legacy_score_headline, corpus)
+    compiled_us = time_per_item(notifier.SCORER.score, corpus)
+    return {
+        "stage": "score_headline",
+        "items": len(corpus),
+        "legacy_us_per_item": round(legacy_us, 2),
+        "compiled_us_per_item": round(compiled_us, 2),
+        "speedup": round(legacy_us / compiled_us, 2) if compiled_us else None,
+    }
+
+
+def bench_batch_scoring(corpus, seed=2026):
+    """Compare score_batch against per-item score_with_age over a dated corpus"""
+    rng = random.Random(seed)
+    now = datetime.datetime(2026, 7, 24, 12, 0)
+    items = [(title, now - datetime.timedelta(hours=rng.uniform(0, 120))) for title in corpus]
+
+    # Per-item scoring lines are logged at DEBUG, which stays off here
+    start = time.perf_counter()
+    for title, pub_date in items:
+        notifier.score_with_age(title, pub_date, now)
+    per_item_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    notifier.score_batch(items, now)
+    batch_s = time.perf_counter() - start
+
+    return {
+        "stage": "score_with_age",
+        "items": len(items),
+        "per_item_us": round(per_item_s / len(items) * 1e6, 2),
+        "per_item_total_s": round(per_item_s, 3),
+        "batch_total_s": round(batch_s, 3),
+        "batch_speedup": round(per_item_s / batch_s, 2) if batch_s else None,
+    }
+
+
+def bench_dedup(corpus, scaled_state):
+    """Fuzzy-duplicate lookups against the scaled fingerprint index, and the reject patterns"""
+    cutoff = notifier.to_epoch(datetime.datetime.utcnow() - datetime.timedelta(days=notifier.SENT_RETENTION_DAYS))
+    fingerprints = scaled_state['title_fingerprints']
+
+    start = time.perf_counter()
+    index = notifier.FingerprintIndex(fingerprints, cutoff=cutoff)
+    build_s = time.perf_counter() - start
+
+    duplicates = sum(1 for title in corpus if notifier.is_fuzzy_duplicate(title, index)[0])
+    fuzzy_us = time_per_item(lambda title: notifier.is_fuzzy_duplicate(title, index), corpus, repeat=1)
+    rejects = sum(1 for title in corpus if notifier.check_universal_reject(title)[0])
+    reject_us = time_per_item(notifier.check_universal_reject, corpus)
+    return [
+        {
+            "stage": "is_fuzzy_duplicate",
+            "items": len(corpus),
+            "fingerprints": len(fingerprints),
+            "index_build_ms": round(build_s * 1000, 1),
+            "us_per_item": round(fuzzy_us, 2),
+            "duplicates": duplicates,
+        },
+        {
+            "stage": "check_universal_reject",
+            "items": len(corpus),
+            "us_per_item": round(reject_us, 2),
+            "rejects": rejects,
+        },
+    ]
+
+
+def bench_state_io(scaled_state, scale):
+    """save_state/load_state on a state BASELINE_STATE_SIZES * scale records large"""
+    records = sum(len(scaled_state[section]) for section in BASELINE_STATE_SIZES)
+    with tempfile.TemporaryDirectory() as tmp, patched(
+            notifier, STATE_DIR=os.path.join(tmp, "state"), LEGACY_STATE_FILE=os.path.join(tmp, "legacy.json")):
+        state = notifier.NotificationState(notifier.open_state_store(), json.loads(json.dumps(scaled_state)))
+        start = time.perf_counter()
+        notifier.save_state(state)
+        initial_save_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        state = notifier.load_state()
+        load_meta_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for section in notifier.STATE_SECTIONS:
+            state[section]
+        load_sections_s = time.perf_counter() - start
+
+        # A typical run: a few new sends and ignored ids, nothing else changed
+        now = datetime.datetime.utcnow().replace(microsecond=0).isoformat()
+        for i in range(5):
+            title = f"Benchmark headline {i}"
+            item = {"id": notifier.generate_id(title, now), "title": title, "url": f"https://example.com/bench/{i}/",
+                    "score": 90, "timestamp": now, "ts": notifier.iso_to_epoch(now), "image": None}
+            notifier.record_sent(state, 'major', item)
+            state['ignored_items'].add(notifier.generate_id(f"Ignored {i}", now))
+        start = time.perf_counter()
+        notifier.save_state(state)
+        incremental_save_s = time.perf_counter() - start
+
+        state_bytes = sum(entry.stat().st_size for entry in os.scandir(notifier.STATE_DIR) if entry.is_file())
+
+    return {
+        "stage": "state_io",
+        "items": records,
+        "scale": scale,
+        "state_bytes": state_bytes,
+        "save_full_ms": round(initial_save_s * 1000, 1),
+        "load_meta_ms": round(load_meta_s * 1000, 1),
+        "load_sections_ms": round(load_sections_s * 1000, 1),
+        "save_incremental_ms": round(incremental_save_s * 1000, 1),
+    }
+
+
+class _FeedHandler(http.server.BaseHTTPRequestHandler):
+    served = b""  # Swapped between runs
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("Content-Length", str(len(self.served)))
+        self.end_headers()
+        self.wfile.write(self.served)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def rss_fixture_server():
+    """Serve _FeedHandler.served on a free localhost port; yields the feed URL"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/rss.xml"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_main_dry_run(feed_items, seed=2026):
+    """Full dry-run main() runs against a local RSS server, sharing one state.
+
+    cold: empty state. unchanged: the same feed again (byte-identical body,
+    so parsing and scoring are skipped). updated: a new feed of which half
+    the items were already seen, the common case for a scheduled run.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    feeds = {
+        "cold": generate_rss(feed_items, seed, now),
+        "unchanged": generate_rss(feed_items, seed, now),
+        "updated": generate_rss(feed_items, items=(
+            generate_rss_items(feed_items // 2, seed + 1, now + datetime.timedelta(hours=1))
+            + generate_rss_items(feed_items - feed_items // 2, seed, now))),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, rss_fixture_server() as url, patched(
+            notifier, STATE_DIR=os.path.join(tmp, "state"), LEGACY_STATE_FILE=os.path.join(tmp, "legacy.json"),
+            FEED_SOURCES=[{'url': url, 'timeout': notifier.FEED_TIMEOUT_SECONDS}],
+            DRY_RUN=True, GEMINI_API_KEY=None):
+        metrics_path = os.path.join(tmp, "metrics.json")
+        for run, feed in feeds.items():
+            _FeedHandler.served = feed.encode("utf-8")
+            start = time.perf_counter()
+            notifier.main(["--metrics", metrics_path, "--trace", "", "--log-level", "WARNING"])
+            run_s = time.perf_counter() - start
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+            result = {"stage": f"main_dry_run:{run}", "items": feed_items, "run_ms": round(run_s * 1000, 1)}
+            for stage, seconds in metrics['stage_seconds'].items():
+                result[f"{stage}_ms"] = round(seconds * 1000, 1)
+            results.append(result)
+    return results
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_MODULES = ["score_and_notify", "manual_dispatch", "init_streams"]
+DEFERRED_MODULES = ["firebase_admin", "requests", "dotenv"]
+
+
+def import_profile(statement):
+    """Cumulative import time (ms) per top-level module from `python -X importtime`"""
+    env = dict(os.environ, PYTHONPATH=SCRIPT_DIR)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=SCRIPT_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed: {result.stderr.strip().splitlines()[-1]}")
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us) / 1000
+    return cumulative
+
+
+def bench_import_time(repeat=3):
+    """Cold-start import cost of each script and which deferred SDKs it still pulls in"""
+    results = []
+    for module in STARTUP_MODULES:
+        best, loaded = None, []
+        for _ in range(repeat):
+            profile = import_profile(f"import {module}")
+            best = profile[module] if best is None else min(best, profile[module])
+            loaded = [name for name in DEFERRED_MODULES if name in profile]
+        results.append({
+            "stage": f"import:{module}",
+            "items": 1,
+            "import_ms": round(best, 1),
+            "deferred_sdks_loaded": ",".join(loaded) or "none",
+        })
+
+    # What the deferral saves: the cost the scripts used to pay up front
+    profile = import_profile("import firebase_admin.messaging, firebase_admin.db, requests")
+    results.append({
+        "stage": "import:deferred_sdks",
+        "items": 1,
+        "import_ms": round(sum(profile.get(name, 0) for name in ("firebase_admin", "requests")), 1),
+    })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the news notification pipeline")
+    parser.add_argument("--count", type=int, default=20000, help="Synthetic headlines to generate")
+    parser.add_argument("--seed", type=int, default=2026, help="Corpus random seed")
+    parser.add_argument("--json", dest="json_path", help="Write machine-readable results to this file")
+    parser.add_argument("--state-scale", type=int, default=100, help="State size as a multiple of BASELINE_STATE_SIZES")
+    parser.add_argument("--feed-items", type=int, default=500, help="Items in the RSS fixture for the main() runs")
+    parser.add_argument("--import-time", action="store_true", help="Only report cold-start import times")
+    args = parser.parse_args()
+
+    if args.import_time:
+        results = bench_import_time()
+    else:
+        corpus = load_state_headlines() + generate_headlines(args.count, args.seed)
+        scaled_state = build_scaled_state(args.state_scale, args.seed)
+        results = [bench_scoring(corpus), bench_batch_scoring(corpus, args.seed)]
+        results += bench_dedup(corpus, scaled_state)
+        results.append(bench_state_io(scaled_state, args.state_scale))
+        results += bench_main_dry_run(args.feed_items, args.seed)
+        results += bench_import_time()
+
+    for result in results:
+        metrics = " | ".join(f"{k}={v}" for k, v in result.items() if k not in ("stage", "items"))
+        print(f"[BENCH] {result['stage']}: {result['items']} items | {metrics}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
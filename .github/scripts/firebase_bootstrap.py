@@ -0,0 +1,73 @@
+"""Shared Firebase Admin setup for the notification scripts.
+
+The app is created on first use and memoized. firebase_admin (and the
+google-auth/grpc stack behind it) is only imported at that point, so dry
+runs, early exits and --help never pay for the SDK import.
+
+Credentials come from the FIREBASE_CREDENTIALS env var (service-account
+JSON), or from a local JSON file where a script allows it.
+"""
+import json
+import os
+
+DATABASE_URL = 'https://boxboxboxapp-default-rtdb.firebaseio.com/'
+
+_APP = None
+
+
+class MissingCredentialsError(ValueError):
+    """No service-account credentials were found"""
+
+
+def load_credentials(cred_json=None, fallback_file=None):
+    """Service-account dict from cred_json, FIREBASE_CREDENTIALS or fallback_file (None if absent)"""
+    cred_json = cred_json or os.environ.get("FIREBASE_CREDENTIALS")
+    if not cred_json and fallback_file and os.path.exists(fallback_file):
+        with open(fallback_file, 'r') as f:
+            cred_json = f.read()
+    if not cred_json:
+        return None
+    return json.loads(cred_json)
+
+
+def is_initialized():
+    if _APP is not None:
+        return True
+    import firebase_admin
+    return bool(firebase_admin._apps)
+
+
+def get_app(cred_json=None, options=None, fallback_file=None):
+    """The default Firebase app, created on the first call.
+
+    Raises MissingCredentialsError when no credentials are available;
+    other errors (malformed JSON or service account, ...) propagate unchanged.
+    """
+    global _APP
+    if _APP is None:
+        import firebase_admin
+        from firebase_admin import credentials
+
+        if firebase_admin._apps:
+            # Initialized earlier in this process (e.g. a Streamlit rerun)
+            _APP = firebase_admin.get_app()
+        else:
+            cred_dict = load_credentials(cred_json, fallback_file)
+            if cred_dict is None:
+                raise MissingCredentialsError("FIREBASE_CREDENTIALS environment variable not set")
+            _APP = firebase_admin.initialize_app(credentials.Certificate(cred_dict), options)
+    return _APP
+
+
+def messaging():
+    """firebase_admin.messaging, with the app initialized"""
+    get_app()
+    from firebase_admin import messaging as fcm
+    return fcm
+
+
+def database():
+    """firebase_admin.db bound to the project's Realtime Database"""
+    get_app(options={'databaseURL': DATABASE_URL})
+    from firebase_admin import db
+    return db
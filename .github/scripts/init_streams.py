@@ -1,26 +1,10 @@
-import os
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import db
-import json
+import firebase_bootstrap
 
 def initialize_firebase():
     """Initialize Firebase Admin SDK using the credentials JSON stored in environment"""
     try:
-        cred_json = os.environ.get('FIREBASE_CREDENTIALS')
-        if not cred_json:
-            raise ValueError("FIREBASE_CREDENTIALS environment variable not set")
-            
-        cred_dict = json.loads(cred_json)
-        cred = credentials.Certificate(cred_dict)
-        
-        # Check if already initialized
-        if not firebase_admin._apps:
-            # We must specify the database map URL for RTDB
-            firebase_admin.initialize_app(cred, {
-                'databaseURL': 'https://boxboxboxapp-default-rtdb.firebaseio.com/'
-            })
-            
+        # We must specify the database map URL for RTDB
+        firebase_bootstrap.get_app(options={'databaseURL': firebase_bootstrap.DATABASE_URL})
         print("[SUCCESS] Firebase initialized")
     except Exception as e:
         print(f"[ERROR] Failed to initialize Firebase: {e}")
@@ -54,7 +38,7 @@ def upload_stream_configs():
         }
     ]
     
-    ref = db.reference("live_config/streams")
+    ref = firebase_bootstrap.database().reference("live_config/streams")
     ref.set(streams)
     
     print("[SUCCESS] initial streaming configuration uploaded to Realtime Database!")
@@ -1,23 +1,17 @@
 import argparse
-import firebase_admin
-from firebase_admin import credentials, messaging
-import json
-import os
 import sys
 from datetime import datetime
 
+import firebase_bootstrap
+
 def init_firebase():
     """Initialize Firebase from Env Var"""
-    cred_json = os.environ.get("FIREBASE_CREDENTIALS")
-    if not cred_json:
-        print("[ERROR] FIREBASE_CREDENTIALS environment variable not set.")
-        sys.exit(1)
-    
     try:
-        cred_dict = json.loads(cred_json)
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred)
+        firebase_bootstrap.get_app()
         print("[INFO] Firebase initialized successfully.")
+    except firebase_bootstrap.MissingCredentialsError:
+        print("[ERROR] FIREBASE_CREDENTIALS environment variable not set.")
+        sys.exit(1)
     except Exception as e:
         print(f"[ERROR] Firebase init failed: {e}")
         sys.exit(1)
@@ -25,6 +19,7 @@ def init_firebase():
 def send_notification(args):
     """Send the notification using Data payload for custom sound support"""
     print(f"[INFO] Preparing to send: '{args.title}'")
+    messaging = firebase_bootstrap.messaging()
     
     # Construct Message
     # We use DATA payload to ensure onMessageReceived is triggered in the app,
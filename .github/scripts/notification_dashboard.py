@@ -1,10 +1,8 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, messaging
-import json
-import os
 from datetime import datetime
 
+import firebase_bootstrap
+
 # Page Config
 st.set_page_config(
     page_title="BOXBOXBOX Notification Center",
@@ -42,25 +40,13 @@ st.title("🏎️ BOXBOXBOX Command Center")
 st.markdown("Send manual notifications with **custom sound** guarantee.")
 
 # --- Firebase Init ---
-if not firebase_admin._apps:
+if not firebase_bootstrap.is_initialized():
     # Try to get credentials from env or file
-    cred_json = os.environ.get("FIREBASE_CREDENTIALS")
-    
     # Fallback to local file if env not set (common for local dev)
-    if not cred_json and os.path.exists("firebase_credentials.json"):
-        with open("firebase_credentials.json", "r") as f:
-            cred_json = f.read()
-            
-    if cred_json:
-        try:
-            cred_dict = json.loads(cred_json)
-            cred = credentials.Certificate(cred_dict)
-            firebase_admin.initialize_app(cred)
-            st.sidebar.success("Firebase Connected ✅")
-        except Exception as e:
-            st.error(f"Firebase Init Error: {e}")
-            st.stop()
-    else:
+    try:
+        firebase_bootstrap.get_app(fallback_file="firebase_credentials.json")
+        st.sidebar.success("Firebase Connected ✅")
+    except firebase_bootstrap.MissingCredentialsError:
         st.warning("⚠️ No credentials found.")
         st.info("Please set `FIREBASE_CREDENTIALS` env var or place `firebase_credentials.json` in this directory.")
         
@@ -69,13 +55,14 @@ if not firebase_admin._apps:
             pasted_creds = st.text_area("JSON Credentials")
             if pasted_creds:
                 try:
-                    cred_dict = json.loads(pasted_creds)
-                    cred = credentials.Certificate(cred_dict)
-                    firebase_admin.initialize_app(cred)
+                    firebase_bootstrap.get_app(pasted_creds)
                     st.rerun()
                 except Exception as e:
                     st.error(f"Invalid JSON: {e}")
         st.stop()
+    except Exception as e:
+        st.error(f"Firebase Init Error: {e}")
+        st.stop()
 
 # --- Form ---
 with st.form("notify_form"):
@@ -128,6 +115,7 @@ if submitted:
             # This is the key: We put everything in 'data' so the Android app's
             # onMessageReceived triggers and builds the notification manually
             # with the custom sound.
+            messaging = firebase_bootstrap.messaging()
             message = messaging.Message(
                 topic="f1_updates",  # Sending to the main topic
                 data={
@@ -0,0 +1,269 @@
+"""Replay archived feed snapshots through the notification logic on a simulated clock.
+
+Each tick runs score_and_notify.run_cycle, the code the scheduled job
+runs, with:
+  - the clock fixed at the tick time,
+  - feed items taken from the newest snapshot captured at or before the
+    tick (items published after the tick are hidden),
+  - FCM replaced by a sink that records every delivery,
+  - state kept in memory, starting empty or from a copy of a saved state.
+
+Snapshots are directories of RSS/Atom files named by UTC capture time
+(20260301T120000Z.xml), one directory per feed source. This is the layout
+the job writes when NOTIFICATION_FEED_ARCHIVE is set.
+Gemini is never called; nuclear candidates get the deterministic
+guardrail verdict.
+
+Usage:
+    python .github/scripts/replay_notifications.py data/feed_archive/www.motorsport.com_rss_f1_news \\
+        [--start 2026-03-01] [--end 2026-12-01] [--tick-minutes 30] \\
+        [--set MAJOR_THRESHOLD=80] [--window slot1=12:30-13:30] [--json sends.json]
+"""
+import argparse
+import bisect
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import score_and_notify as notifier
+from script_patching import patched
+from state_store import RingIdSet
+
+SNAPSHOT_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+class Snapshot:
+    """One archived feed body, parsed once up front"""
+
+    def __init__(self, path, source, parsed_dates=None):
+        self.path = path
+        self.captured = datetime.datetime.strptime(os.path.splitext(os.path.basename(path))[0], SNAPSHOT_TIME_FORMAT)
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.content_hash = hashlib.sha256(body).hexdigest()
+        stream = notifier.FeedItemStream([body], source=source)
+        self.items = list(stream)
+        if stream.error is not None:
+            print(f"[WARN] {path}: {stream.error} (kept {len(self.items)} items)", file=sys.stderr)
+        # Consecutive snapshots share most items, so dates are parsed once per source
+        parsed_dates = {} if parsed_dates is None else parsed_dates
+        self.pub_dates = []
+        for item in self.items:
+            if item.pub_date_str not in parsed_dates:
+                try:
+                    parsed_dates[item.pub_date_str] = notifier.parse_pub_date(item.pub_date_str)
+                except Exception:
+                    parsed_dates[item.pub_date_str] = None  # run_cycle skips these itself
+            self.pub_dates.append(parsed_dates[item.pub_date_str])
+
+    def visible_items(self, now):
+        """Items already published at `now`"""
+        return [item for item, pub_date in zip(self.items, self.pub_dates) if pub_date is None or pub_date <= now]
+
+
+class SnapshotSource:
+    """All snapshots of one feed, ordered by capture time"""
+
+    def __init__(self, directory):
+        self.url = os.path.basename(os.path.normpath(directory))
+        self.snapshots = []
+        parsed_dates = {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.xml'):
+                continue
+            try:
+                self.snapshots.append(Snapshot(os.path.join(directory, name), self.url, parsed_dates))
+            except ValueError:
+                print(f"[WARN] Skipping {name}: not named {SNAPSHOT_TIME_FORMAT}.xml", file=sys.stderr)
+        self.snapshots.sort(key=lambda snapshot: snapshot.captured)
+        self._captured = [snapshot.captured for snapshot in self.snapshots]
+
+    def at(self, now):
+        """Newest snapshot captured at or before `now` (None before the first)"""
+        index = bisect.bisect_right(self._captured, now)
+        return self.snapshots[index - 1] if index else None
+
+
+class ReplayIngest:
+    """FeedIngest stand-in serving snapshot items for one tick.
+
+    A source counts as changed when its snapshot or the number of visible
+    items differs from what the previous tick saw, which mirrors the
+    content-hash check of a real fetch.
+    """
+
+    def __init__(self, sources, now, feed_cache):
+        # sources: SnapshotSources (their urls are the feed names run_cycle sees)
+        self.results = {}
+        self._items = []
+        self._stopped = set()
+        for source in sources:
+            result = {'changed': False, 'count': 0, 'error': None, 'cache_entry': feed_cache.get(source.url, {}),
+                      'fetch_seconds': 0.0, 'parse_seconds': 0.0}
+            snapshot = source.at(now)
+            if snapshot is not None:
+                items = snapshot.visible_items(now)
+                cache_entry = {'content_hash': f"{snapshot.content_hash}:{len(items)}"}
+                if cache_entry != result['cache_entry']:
+                    result.update(changed=True, count=len(items), cache_entry=cache_entry)
+                    self._items.extend(items)
+            self.results[source.url] = result
+
+    def has_items(self):
+        return bool(self._items)
+
+    def __iter__(self):
+        for item in self._items:
+            if item.source not in self._stopped:
+                yield item
+
+    def stop(self, url):
+        self._stopped.add(url)
+
+    def close(self):
+        pass
+
+
+class Replay:
+    """Drives run_cycle tick by tick and records what would have been sent"""
+
+    def __init__(self, sources, state=None):
+        self.sources = sources
+        self.state = state if state is not None else empty_state()
+        self.now = None
+        self.sends = []
+
+    def ingest(self, sources, feed_cache):
+        return ReplayIngest(self.sources, self.now, feed_cache)
+
+    def sink(self, fields):
+        data = fields['data'] or {}
+        self.sends.append({
+            'time': self.now.isoformat(),
+            'type': data.get('type'),
+            'score': int(data['score']) if data.get('score') else None,
+            'title': fields['title'],
+            'body': fields['body'],
+        })
+        return True
+
+    def run(self, start, end, tick):
+        ticks = 0
+        self.now = start
+        while self.now <= end:
+            notifier.run_cycle(self.state, now=self.now, ingest=self.ingest, sink=self.sink)
+            ticks += 1
+            self.now += tick
+        return ticks
+
+
+def empty_state():
+    state = notifier.create_default_state()
+    for section, capacity in notifier.STATE_ID_SETS.items():
+        state[section] = RingIdSet(capacity, state[section])
+    return state
+
+
+def load_initial_state(path):
+    """In-memory copy of a saved state (a state directory or a legacy JSON file)"""
+    if os.path.isdir(path):
+        settings = {'STATE_DIR': path, 'LEGACY_STATE_FILE': os.path.join(path, 'missing.json')}
+    else:
+        settings = {'STATE_DIR': path + '.missing', 'LEGACY_STATE_FILE': path}
+    with patched(notifier, **settings):
+        state = notifier.load_state(sections=notifier.STATE_SECTIONS)
+    return dict(state)  # Detached from the store: nothing is written back
+
+
+def parse_setting(assignment):
+    """NAME=VALUE for a numeric score_and_notify constant"""
+    name, _, value = assignment.partition('=')
+    current = getattr(notifier, name, None)
+    if not name.isupper() or not isinstance(current, (int, float)) or isinstance(current, bool):
+        raise argparse.ArgumentTypeError(f"{name} is not a numeric setting of score_and_notify")
+    return name, type(current)(value)
+
+
+def parse_window(assignment):
+    """name=HH:MM-HH:MM for an entry of TIME_WINDOWS"""
+    name, _, span = assignment.partition('=')
+    if name not in notifier.TIME_WINDOWS:
+        raise argparse.ArgumentTypeError(f"unknown window {name!r} (known: {', '.join(notifier.TIME_WINDOWS)})")
+    try:
+        start, end = (tuple(int(part) for part in bound.split(':')) for bound in span.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected {name}=HH:MM-HH:MM, got {assignment!r}")
+    return name, (start, end)
+
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay archived feed snapshots on a simulated clock")
+    parser.add_argument("archives", nargs="+", help="Snapshot directories, one per feed source")
+    parser.add_argument("--start", type=parse_time, help="First tick (UTC, default: first snapshot)")
+    parser.add_argument("--end", type=parse_time, help="Last tick (UTC, default: last snapshot)")
+    parser.add_argument("--tick-minutes", type=float, default=30, help="Minutes between simulated runs")
+    parser.add_argument("--state", help="Start from a copy of this state directory or legacy JSON file")
+    parser.add_argument("--set", dest="settings", type=parse_setting, action="append", default=[],
+                        metavar="NAME=VALUE", help="Override a threshold, e.g. MAJOR_THRESHOLD=80")
+    parser.add_argument("--window", dest="windows", type=parse_window, action="append", default=[],
+                        metavar="NAME=HH:MM-HH:MM", help="Override a TIME_WINDOWS entry (UTC)")
+    parser.add_argument("--json", dest="json_path", help="Write the sends and a summary to this file")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    sources = [SnapshotSource(directory) for directory in args.archives]
+    captured = [snapshot.captured for source in sources for snapshot in source.snapshots]
+    if not captured:
+        parser.error("no snapshots found")
+    start = args.start or min(captured)
+    end = args.end or max(captured)
+
+    state = load_initial_state(args.state) if args.state else None
+    replay = Replay(sources, state)
+    windows = dict(notifier.TIME_WINDOWS, **dict(args.windows))
+    notifier.configure_logging("WARNING")
+
+    started = time.perf_counter()
+    feeds = [{'url': source.url, 'timeout': 0} for source in sources]
+    with patched(notifier, FEED_SOURCES=feeds, GEMINI_API_KEY=None, TIME_WINDOWS=windows, **dict(args.settings)):
+        ticks = replay.run(start, end, datetime.timedelta(minutes=args.tick_minutes))
+    elapsed = time.perf_counter() - started
+
+    if not args.quiet:
+        for send in replay.sends:
+            score = send['score'] if send['score'] is not None else '-'
+            label = send['title'] if send['type'] == 'digest' else send['body'].splitlines()[0]
+            print(f"{send['time'][:16].replace('T', ' ')}  {send['type']:<8} {score:>4}  {label}")
+
+    by_type = {}
+    for send in replay.sends:
+        by_type[send['type']] = by_type.get(send['type'], 0) + 1
+    summary = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'ticks': ticks,
+        'snapshots': len(captured),
+        'sends': by_type,
+        'settings': dict(args.settings),
+        'windows': {name: [list(bound) for bound in window] for name, window in dict(args.windows).items()},
+        'elapsed_seconds': round(elapsed, 2),
+    }
+    print(f"[REPLAY] {ticks} ticks from {start} to {end} in {elapsed:.1f}s | "
+          + " | ".join(f"{kind}={count}" for kind, count in sorted(by_type.items())))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'summary': summary, 'sends': replay.sends}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Sweep scoring weights and thresholds over a corpus of past headlines.
+
+Every rule is evaluated once per headline into a sparse headline x rule
+hit matrix (CSR: indptr/indices over the scored rules, plus per-headline
+flags for nuclear hits, nuclear/digest disqualifiers and universal
+rejects). Rescoring under any candidate weights is then one sparse
+matrix-vector product, so a grid of thousands of configurations takes
+seconds. Grid points are spread over a process pool; NumPy is used when
+installed and a pure-Python path is used otherwise.
+
+Headlines come from feed snapshots (NOTIFICATION_FEED_ARCHIVE directories
+or single .xml files), plain text files (one headline per line) and the
+notification state. The state also provides the labels: a headline
+counts as a past send if it is in nuclear_sent or major_sent. Scores are
+base scores (age decay is left out), the same as score_headline.
+
+Usage:
+    python .github/scripts/rule_sweep.py data/feed_archive --state data/notification_state \\
+        --grid MAJOR_THRESHOLD=70:100:5 --grid DIGEST_THRESHOLD=40:60:5 \\
+        --grid "broad:*=0.5:1.5:0.25" --grid medium:5=20,30,40 [--workers 4] [--json sweep.json]
+
+A grid key is a threshold (MAJOR_THRESHOLD, DIGEST_THRESHOLD), a rule id
+(points for that rule, e.g. major:3) or table:* (multiplier for every rule
+of a table). Values are start:stop:step (inclusive) or a comma list.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import score_and_notify as notifier
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SCORED_TABLES = ('major', 'medium', 'broad', 'negative')
+FLAG_TABLES = ('nuclear', 'nuclear_disq', 'reject', 'digest_disq')
+CATEGORIES = ('nuclear', 'major', 'digest', 'ignore', 'reject')
+
+
+def rules_fingerprint(scorer):
+    """Hash of every rule id, pattern and weight; a saved matrix is only valid for the same rules"""
+    digest = hashlib.sha256()
+    for rule in scorer.rules():
+        digest.update(f"{rule.rule_id}\0{rule.pattern}\0{rule.points}\0".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class HitMatrix:
+    """Which rules match which headline, evaluated once"""
+
+    def __init__(self, titles, sent, scored_rules, points, indptr, indices, flags, fingerprint):
+        self.titles = titles
+        self.sent = sent              # per headline: True if it was pushed as nuclear/major
+        self.scored_rules = scored_rules  # column ids (scored tables only)
+        self.points = points          # current weight per column
+        self.indptr = indptr          # CSR row pointers into indices
+        self.indices = indices        # column index per hit
+        self.flags = flags            # table -> per-headline bool list (any hit in that table)
+        self.fingerprint = fingerprint
+        self._arrays = None
+
+    @classmethod
+    def build(cls, titles, sent, scorer=None):
+        scorer = scorer or notifier.SCORER
+        scored_rules = [rule for rule in scorer.rules() if rule.rule_id.split(':', 1)[0] in SCORED_TABLES]
+        column = {rule.rule_id: i for i, rule in enumerate(scored_rules)}
+        indptr, indices = [0], []
+        flags = {table: [] for table in FLAG_TABLES}
+        for title in titles:
+            hit_tables = set()
+            for rule in scorer.matching_rules(title):
+                if rule.rule_id in column:
+                    indices.append(column[rule.rule_id])
+                else:
+                    hit_tables.add(rule.rule_id.split(':', 1)[0])
+            indptr.append(len(indices))
+            for table in FLAG_TABLES:
+                flags[table].append(table in hit_tables)
+        return cls(titles, sent, [rule.rule_id for rule in scored_rules], [rule.points for rule in scored_rules],
+                   indptr, indices, flags, rules_fingerprint(scorer))
+
+    def to_dict(self):
+        return {
+            'fingerprint': self.fingerprint, 'titles': self.titles, 'sent': self.sent,
+            'scored_rules': self.scored_rules, 'points': self.points,
+            'indptr': self.indptr, 'indices': self.indices, 'flags': self.flags,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['titles'], data['sent'], data['scored_rules'], data['points'],
+                   data['indptr'], data['indices'], data['flags'], data['fingerprint'])
+
+    def __len__(self):
+        return len(self.titles)
+
+    def arrays(self):
+        """NumPy views: per-hit row ids, per-hit columns and the flag/label vectors"""
+        if self._arrays is None:
+            indptr = np.asarray(self.indptr, dtype=np.int64)
+            self._arrays = {
+                'rows': np.repeat(np.arange(len(self), dtype=np.int64), np.diff(indptr)),
+                'cols': np.asarray(self.indices, dtype=np.int64),
+                'sent': np.asarray(self.sent, dtype=bool),
+            }
+            for table in FLAG_TABLES:
+                self._arrays[table] = np.asarray(self.flags[table], dtype=bool)
+        return self._arrays
+
+    def scores(self, weights):
+        """Base score of every headline under `weights` (one per scored rule)"""
+        if np is not None:
+            a = self.arrays()
+            return np.bincount(a['rows'], weights=np.asarray(weights, dtype=float)[a['cols']], minlength=len(self))
+        return [
+            sum(weights[self.indices[k]] for k in range(self.indptr[row], self.indptr[row + 1]))
+            for row in range(len(self))
+        ]
+
+    def evaluate(self, weights, major_threshold, digest_threshold):
+        """Category counts and agreement with past sends for one configuration"""
+        scores = self.scores(weights)
+        if np is not None:
+            a = self.arrays()
+            reject = a['reject']
+            nuclear = a['nuclear'] & ~a['nuclear_disq'] & ~reject
+            scored = ~reject & ~nuclear
+            major = scored & (scores >= major_threshold)
+            digest = scored & ~major & (scores >= digest_threshold) & ~a['digest_disq']
+            pushed = nuclear | major
+            counts = {
+                'nuclear': int(nuclear.sum()), 'major': int(major.sum()), 'digest': int(digest.sum()),
+                'reject': int(reject.sum()),
+            }
+            counts['ignore'] = len(self) - sum(counts.values())
+            sent = a['sent']
+            sent_pushed = int((pushed & sent).sum())
+            agree = int((pushed == sent).sum())
+        else:
+            counts = dict.fromkeys(CATEGORIES, 0)
+            sent_pushed = agree = 0
+            for row, score in enumerate(scores):
+                category = self._category(row, score, major_threshold, digest_threshold)
+                counts[category] += 1
+                pushed = category in ('nuclear', 'major')
+                sent_pushed += pushed and self.sent[row]
+                agree += pushed == self.sent[row]
+        sent_total = sum(self.sent)
+        return {
+            'counts': counts,
+            'recall': round(sent_pushed / sent_total, 4) if sent_total else None,
+            'agreement': round(agree / len(self), 4) if len(self) else None,
+        }
+
+    def _category(self, row, score, major_threshold, digest_threshold):
+        flags = self.flags
+        if flags['reject'][row]:
+            return 'reject'
+        if flags['nuclear'][row] and not flags['nuclear_disq'][row]:
+            return 'nuclear'
+        if score >= major_threshold:
+            return 'major'
+        if score >= digest_threshold and not flags['digest_disq'][row]:
+            return 'digest'
+        return 'ignore'
+
+    def check(self, scorer=None):
+        """Categories under the current weights must match CompiledScorer.evaluate"""
+        scorer = scorer or notifier.SCORER
+        scores = self.scores(self.points)
+        for row, title in enumerate(self.titles):
+            if self.flags['reject'][row]:
+                continue
+            expected = scorer.evaluate(title)[1]
+            actual = self._category(row, scores[row], notifier.MAJOR_THRESHOLD, notifier.DIGEST_THRESHOLD)
+            if actual == 'ignore' and expected == 'digest' and self.flags['digest_disq'][row]:
+                continue  # Disqualified later, in score_with_age
+            if actual != expected:
+                raise AssertionError(f"Hit matrix disagrees with CompiledScorer on {title!r}: {actual} != {expected}")
+
+
+# ============================================================================
+# CORPUS
+# ============================================================================
+
+def load_state_labels(path):
+    """(titles of past nuclear/major sends, other titles recorded in the state)"""
+    from replay_notifications import load_initial_state
+    state = load_initial_state(path)
+    sent = [item['title'] for item in state['nuclear_sent'] + state['major_sent'] if item.get('title')]
+    other = [item['title'] for item in state['digest_items'] + state['nuclear_queue'] if item.get('title')]
+    return sent, other
+
+
+def read_feed_titles(path):
+    with open(path, 'rb') as f:
+        return [item.title for item in notifier.FeedItemStream([f.read()]) if item.title]
+
+
+def load_corpus(paths, state_path=None):
+    """Unique titles (first-seen order) and their sent labels"""
+    titles = []
+    sent_titles = set()
+    if state_path:
+        sent, other = load_state_labels(state_path)
+        sent_titles.update(sent)
+        titles.extend(sent + other)
+    for path in paths:
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for file_path in files:
+            if file_path.endswith('.xml'):
+                titles.extend(read_feed_titles(file_path))
+            elif file_path.endswith('.txt'):
+                with open(file_path, encoding='utf-8') as f:
+                    titles.extend(line.strip() for line in f if line.strip())
+    titles = list(dict.fromkeys(titles))
+    return titles, [title in sent_titles for title in titles]
+
+
+# ============================================================================
+# GRID SEARCH
+# ============================================================================
+
+def parse_values(spec):
+    if ':' in spec:
+        start, stop, step = (float(part) for part in spec.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 6) for i in range(count)]
+    return [float(value) for value in spec.split(',')]
+
+
+def parse_grid(assignment):
+    key, _, spec = assignment.partition('=')
+    if not spec:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUES, got {assignment!r}")
+    try:
+        return key, parse_values(spec)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad values in {assignment!r} (start:stop:step or a,b,c)")
+
+
+def configuration(matrix, point):
+    """(weights, major_threshold, digest_threshold) for a grid point {key: value}"""
+    weights = list(matrix.points)
+    column = {rule_id: i for i, rule_id in enumerate(matrix.scored_rules)}
+    for key, value in point.items():
+        if key.endswith(':*'):
+            table = key[:-2]
+            for i, rule_id in enumerate(matrix.scored_rules):
+                if rule_id.split(':', 1)[0] == table:
+                    weights[i] = matrix.points[i] * value
+        elif key in column:
+            weights[column[key]] = value
+    return (weights, point.get('MAJOR_THRESHOLD', notifier.MAJOR_THRESHOLD),
+            point.get('DIGEST_THRESHOLD', notifier.DIGEST_THRESHOLD))
+
+
+_WORKER_MATRIX = None
+
+
+def _init_worker(matrix_data):
+    global _WORKER_MATRIX
+    _WORKER_MATRIX = HitMatrix.from_dict(matrix_data)
+
+
+def _evaluate_points(points):
+    return [dict(_WORKER_MATRIX.evaluate(*configuration(_WORKER_MATRIX, point)), point=point) for point in points]
+
+
+def grid_search(matrix, grid, workers=None, chunk_size=64):
+    """Evaluate every combination of the grid values, in a process pool when workers > 1"""
+    keys = [key for key, _ in grid]
+    points = [dict(zip(keys, values)) for values in itertools.product(*(values for _, values in grid))]
+    chunks = [points[i:i + chunk_size] for i in range(0, len(points), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        _init_worker(matrix.to_dict())
+        return [result for chunk in chunks for result in _evaluate_points(chunk)]
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(matrix.to_dict(),)) as pool:
+        return [result for chunk_results in pool.map(_evaluate_points, chunks) for result in chunk_results]
+
+
+def validate_grid_keys(grid, matrix):
+    tables = set(rule_id.split(':', 1)[0] for rule_id in matrix.scored_rules)
+    for key, _ in grid:
+        if key in ('MAJOR_THRESHOLD', 'DIGEST_THRESHOLD') or key in matrix.scored_rules:
+            continue
+        if key.endswith(':*') and key[:-2] in tables:
+            continue
+        raise SystemExit(f"Unknown grid key {key!r}: use MAJOR_THRESHOLD, DIGEST_THRESHOLD, a scored rule id "
+                         f"(e.g. {matrix.scored_rules[0]}) or a table multiplier "
+                         f"({', '.join(table + ':*' for table in sorted(tables))})")
+
+
+def format_result(result):
+    counts = " ".join(f"{category}={result['counts'][category]}" for category in CATEGORIES)
+    point = " ".join(f"{key}={value:g}" for key, value in result['point'].items()) or "current rules"
+    return f"agreement={result['agreement']} recall={result['recall']} | {counts} | {point}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep scoring weights and thresholds over past headlines")
+    parser.add_argument("corpus", nargs="*", help="Feed snapshot files/directories (.xml) or headline lists (.txt)")
+    parser.add_argument("--state", help="State directory or legacy JSON file (past sends and their labels)")
+    parser.add_argument("--matrix", help="Hit matrix file: reused if it matches the current rules, else (re)built and saved")
+    parser.add_argument("--grid", type=parse_grid, action="append", default=[], metavar="KEY=VALUES",
+                        help="Grid axis (repeatable)")
+    parser.add_argument("--workers", type=int, help="Processes for the grid search (default: CPU count)")
+    parser.add_argument("--top", type=int, default=10, help="Configurations to print")
+    parser.add_argument("--json", dest="json_path", help="Write every grid result to this file")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    matrix = None
+    if args.matrix and os.path.exists(args.matrix):
+        with open(args.matrix) as f:
+            data = json.load(f)
+        if data['fingerprint'] == rules_fingerprint(notifier.SCORER):
+            matrix = HitMatrix.from_dict(data)
+        else:
+            print("[SWEEP] Rules changed since the matrix was saved; rebuilding")
+    if matrix is None:
+        if not args.corpus and not args.state:
+            parser.error("give a corpus and/or --state (or an up-to-date --matrix)")
+        titles, sent = load_corpus(args.corpus, args.state)
+        matrix = HitMatrix.build(titles, sent)
+        matrix.check()
+        if args.matrix:
+            with open(args.matrix, 'w') as f:
+                json.dump(matrix.to_dict(), f, separators=(',', ':'))
+    print(f"[SWEEP] {len(matrix)} headlines x {len(matrix.scored_rules)} scored rules, "
+          f"{len(matrix.indices)} hits, {sum(matrix.sent)} past sends "
+          f"({time.perf_counter() - started:.1f}s, {'numpy' if np is not None else 'pure Python'})")
+
+    validate_grid_keys(args.grid, matrix)
+    baseline = dict(matrix.evaluate(*configuration(matrix, {})), point={})
+    print(f"[SWEEP] baseline: {format_result(baseline)}")
+
+    started = time.perf_counter()
+    results = grid_search(matrix, args.grid, args.workers)
+    elapsed = time.perf_counter() - started
+    results.sort(key=lambda result: (result['agreement'] or 0, result['recall'] or 0), reverse=True)
+    print(f"[SWEEP] {len(results)} configurations in {elapsed:.1f}s; top {min(args.top, len(results))}:")
+    for result in results[:args.top]:
+        print(f"  {format_result(result)}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'baseline': baseline, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,81 @@
 import os
+import sys
 import json
+import signal
+import argparse
+import logging
+import contextlib
 import hashlib
 import datetime
 import re
-import requests
+import math
+import time
+import queue
+import heapq
+import threading
+import email.utils
+import base64
+import bisect
+from array import array
+from collections import Counter, namedtuple
 import xml.etree.ElementTree as ET
-import firebase_admin
-from firebase_admin import credentials, messaging
-from difflib import SequenceMatcher
-from dotenv import load_dotenv
-
-load_dotenv()
+from state_store import JsonlStateStore, RingIdSet, record_key
+import firebase_bootstrap
+
+try:
+    from re import _parser as _sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse as _sre_parse
+
+log = logging.getLogger("score_and_notify")
+
+def load_env_file():
+    """Load a development .env; dotenv is only imported when one exists"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        env_path = os.path.join(directory, '.env')
+        if os.path.exists(env_path):
+            from dotenv import load_dotenv
+            load_dotenv(env_path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+load_env_file()
 
 # --- Configuration ---
 RSS_URL = "https://www.motorsport.com/rss/f1/news/"
-STATE_FILE = "data/notification_state.json"
+FEED_TIMEOUT_SECONDS = 10
+FEED_SOURCES = [  # Overridden by NOTIFICATION_FEEDS="url[|timeout],..."
+    {'url': RSS_URL, 'timeout': FEED_TIMEOUT_SECONDS},
+]
+HTTP_POOL_SIZE = 8  # Keep-alive connections per host in the shared session
+STATE_DIR = "data/notification_state"
+LEGACY_STATE_FILE = "data/notification_state.json"  # Pre-JSONL single-file state
 FCM_TOPIC = "all_users"
+FCM_BATCH_SIZE = 500  # messaging.send_each limit per call
+OUTBOX_RETRY_BASE_SECONDS = 60  # First retry delay; doubles per failed attempt
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_MAX_ATTEMPTS = 8
+# Nuclear/major alerts live through their whole retry schedule plus one cron
+# interval (about 2.5h), so the attempt limit normally ends them first; a
+# digest expires when its window closes
+OUTBOX_MAX_AGE_SECONDS = sum(min(OUTBOX_RETRY_BASE_SECONDS * 2 ** n, OUTBOX_RETRY_MAX_SECONDS)
+                             for n in range(OUTBOX_MAX_ATTEMPTS - 1)) + 30 * 60
+FEED_LOOKBACK_HOURS = 6  # Re-check items this far behind the high-water mark (catches edits)
 DRY_RUN = os.environ.get('NOTIFICATION_DRY_RUN', 'false').lower() == 'true'
+DAEMON_POLL_SECONDS = float(os.environ.get('NOTIFICATION_POLL_SECONDS', '60'))
+DAEMON_CHECKPOINT_SECONDS = float(os.environ.get('NOTIFICATION_CHECKPOINT_SECONDS', '300'))
+STREAM_FEED = os.environ.get('NOTIFICATION_STREAM_FEED', 'false').lower() == 'true'  # For archive/backfill feeds
+FEED_ARCHIVE_DIR = os.environ.get('NOTIFICATION_FEED_ARCHIVE')  # Save changed feed bodies here (for replay)
+LOG_LEVEL = os.environ.get('NOTIFICATION_LOG_LEVEL', 'INFO').upper()  # DEBUG adds per-item and per-rule lines
+TRACE_FILE = os.environ.get('NOTIFICATION_TRACE_FILE')  # Per-item JSONL trace (also --trace)
+METRICS_FILE = os.environ.get('NOTIFICATION_METRICS_FILE')  # Per-stage timings (also --metrics); .prom for Prometheus. Keep it out of STATE_DIR, which is committed
 
 # --- State Schema Version ---
-STATE_SCHEMA_VERSION = 3
+STATE_SCHEMA_VERSION = 5
 
 # --- Scoring Constants ---
 NUCLEAR_SCORE = 999
@@ -29,6 +85,10 @@ DIGEST_THRESHOLD = 25  # Lowered from 40 for broader matching
 DIGEST_COMBINED_THRESHOLD = 100  # Lowered from 150
 MINIMUM_SCORE = 15  # Auto-ignore below this
 GEMINI_MAX_DAILY_CALLS = 5  # Conservative cap for free tier (20 RPD)
+GEMINI_CACHE_TTL_HOURS = 72  # Reuse a verdict for republished/edited headlines this long
+GEMINI_CACHE_MAX_ENTRIES = 500
+NUCLEAR_VALIDATION_DEADLINE_SECONDS = 20  # Run-wide cap on waiting for AI validation
+NUCLEAR_VALIDATION_BATCH_WINDOW = 0.25  # Seconds to gather more candidates into one request
 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
@@ -61,15 +121,20 @@ F1_ENTITY_PATTERN = re.compile(
 # --- Retention Periods (days) ---
 SENT_RETENTION_DAYS = 30  # nuclear + major
 DIGEST_RETENTION_DAYS = 14
-IGNORED_ITEMS_CAP = 5000
+IGNORED_ITEMS_CAP = 200000  # Ring of 64-bit ids, ~1.6 MB when full
+
+# --- Fuzzy Dedup ---
+FUZZY_DUP_THRESHOLD = 0.80  # Jaccard similarity of normalized title tokens
 
 # --- Time Windows (UTC) ---
-SLOT1_START_HOUR, SLOT1_START_MIN = 7, 30
-SLOT1_END_HOUR, SLOT1_END_MIN = 8, 30
-SLOT2_START_HOUR, SLOT2_START_MIN = 15, 30
-SLOT2_END_HOUR, SLOT2_END_MIN = 16, 30
-DIGEST_START_HOUR, DIGEST_START_MIN = 2, 30
-DIGEST_END_HOUR, DIGEST_END_MIN = 3, 30
+# name -> ((start hour, minute), (end hour, minute)), end exclusive.
+# A window that ends before it starts wraps past midnight.
+TIME_WINDOWS = {
+    'slot1': ((7, 30), (8, 30)),
+    'slot2': ((15, 30), (16, 30)),
+    'digest': ((2, 30), (3, 30)),
+    'nuclear_quiet_hours': ((19, 30), (2, 30)),  # 7:30PM - 2:30AM
+}
 
 # --- Universal Pre-Filters (Hard Reject Patterns) ---
 UNIVERSAL_REJECT_PATTERNS = [
@@ -228,24 +293,183 @@ AGE_DECAY_CURVES = {
 # STATE MANAGEMENT
 # ============================================================================
 
-def load_state():
-    """Load and migrate state to current schema version"""
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            state = json.load(f)
+def _by_timestamp(item):
+    return (item.get('timestamp', ''), item.get('id', ''))
+
+# List sections kept as JSONL segments, with the sort order of their
+# compacted snapshots (None keeps list order). Everything else is meta.
+STATE_SECTIONS = {
+    'nuclear_sent': _by_timestamp,
+    'nuclear_queue': _by_timestamp,
+    'major_sent': _by_timestamp,
+    'digest_items': _by_timestamp,
+    'ignored_items': None,  # RingIdSet blob, see STATE_ID_SETS
+    'sent_urls': record_key,  # {'id': url, 'count': n} (plain URLs before v5)
+    'title_fingerprints': lambda fp: (fp['ts'], fp['title']),
+    'gemini_cache': lambda entry: (entry['ts'], entry['id']),
+    'outbox': lambda entry: (entry['next_retry'], entry['id']),
+}
+
+# Sections stored as binary RingIdSets (name -> capacity)
+STATE_ID_SETS = {
+    'ignored_items': IGNORED_ITEMS_CAP,
+}
+
+# Sections expired by age, held as TimeOrderedRecords in memory
+TIME_ORDERED_SECTIONS = ('nuclear_sent', 'major_sent', 'title_fingerprints')
+
+def record_epoch(record):
+    """Epoch seconds of a record ('ts', or its ISO 'timestamp' for records from before v5)"""
+    epoch = record.get('ts')
+    return epoch if epoch is not None else iso_to_epoch(record['timestamp'])
+
+class TimeOrderedRecords(list):
+    """Records sorted by epoch, with the epochs kept in a parallel list.
+
+    append() inserts in order and expire() is a bisect plus a truncation
+    of the head, so dropping old records only touches the expired ones.
+    Other list mutators bypass `epochs` and must not be used.
+    """
+
+    def __init__(self, records=()):
+        keyed = sorted(((record_epoch(record), record) for record in records), key=lambda pair: pair[0])
+        super().__init__(record for _, record in keyed)
+        self.epochs = [epoch for epoch, _ in keyed]
+
+    def append(self, record):
+        epoch = record_epoch(record)
+        index = bisect.bisect_right(self.epochs, epoch)
+        self.epochs.insert(index, epoch)
+        self.insert(index, record)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def expire(self, cutoff):
+        """Remove and return the records with an epoch at or before `cutoff`"""
+        index = bisect.bisect_right(self.epochs, cutoff)
+        expired = self[:index]
+        del self[:index]
+        del self.epochs[:index]
+        return expired
+
+def time_ordered(state, section):
+    """state[section] as TimeOrderedRecords (plain lists are converted on first use)"""
+    records = state[section]
+    if not isinstance(records, TimeOrderedRecords):
+        records = state[section] = TimeOrderedRecords(records)
+    return records
+
+def sent_url_counts(state):
+    """state['sent_urls'] as a Counter of sent records per URL.
+
+    Saved as {'id': url, 'count': n} records and kept up to date by
+    record_sent() and expire_sent(); it is only rebuilt from the sent
+    lists when the section is missing or predates v5.
+    """
+    urls = state.get('sent_urls')
+    if isinstance(urls, Counter):
+        return urls
+    if urls is not None and state.get('schema_version', 1) >= 5:
+        counts = Counter({record['id']: record['count'] for record in urls})
+    else:
+        counts = Counter(record['url'] for section in ('nuclear_sent', 'major_sent') for record in state[section])
+    state['sent_urls'] = counts
+    return counts
+
+def url_count_records(counts):
+    """A sent_urls Counter in its saved form"""
+    return [{'id': url, 'count': count} for url, count in counts.items()]
+
+def record_sent(state, kind, item):
+    """Add a delivered item to <kind>_sent and the URL index"""
+    urls = sent_url_counts(state)  # Counted before the item joins the sent list
+    time_ordered(state, f"{kind}_sent").append(item)
+    urls[item['url']] += 1
+
+def expire_sent(state, cutoff):
+    """Drop sent records with an epoch at or before `cutoff`, and their URLs once unused"""
+    urls = sent_url_counts(state)
+    for section in ('nuclear_sent', 'major_sent'):
+        for record in time_ordered(state, section).expire(cutoff):
+            urls[record['url']] -= 1
+            if urls[record['url']] <= 0:
+                del urls[record['url']]
+
+def open_state_store():
+    return JsonlStateStore(STATE_DIR, STATE_SECTIONS, STATE_ID_SETS)
+
+class NotificationState(dict):
+    """State dict whose list sections are read from the store on first access"""
+
+    def __init__(self, store, fields):
+        super().__init__(fields)
+        self.store = store
+        self.metrics = None  # RunMetrics charged with lazy section reads
+
+    def __missing__(self, key):
+        if key not in STATE_SECTIONS or not self.store.exists():
+            raise KeyError(key)
+        if self.metrics is None:
+            value = self.store.read_section(key)
+        else:
+            with self.metrics.stage('state_load'):
+                value = self.store.read_section(key)
+        if key in TIME_ORDERED_SECTIONS:
+            value = TimeOrderedRecords(value)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+def load_state(sections=()):
+    """Load and migrate state to current schema version.
+
+    Only meta and the requested sections are read up front; any other
+    section is read the first time the run touches it.
+    """
+    store = open_state_store()
+    if store.exists():
+        state = NotificationState(store, store.read_meta())
+        for section in sections:
+            state[section]
+    elif os.path.exists(LEGACY_STATE_FILE):
+        log.info("[INFO] Converting %s to %s/ ...", LEGACY_STATE_FILE, STATE_DIR)
+        with open(LEGACY_STATE_FILE, 'r') as f:
+            state = NotificationState(store, json.load(f))
     else:
-        state = create_default_state()
+        state = NotificationState(store, create_default_state())
     
     # Migrate to v2 if needed
     if state.get('schema_version', 1) == 1:
-        print("[INFO] Migrating state from v1 to v2...")
+        log.info("[INFO] Migrating state from v1 to v2...")
         state = migrate_v1_to_v2(state)
     
     # Migrate to v3 if needed (scoring overhaul)
     if state.get('schema_version', 1) == 2:
-        print("[INFO] Migrating state from v2 to v3 (scoring overhaul)...")
+        log.info("[INFO] Migrating state from v2 to v3 (scoring overhaul)...")
         state = migrate_v2_to_v3(state)
     
+    # Migrate to v4 if needed (compact fingerprints)
+    if state.get('schema_version', 1) == 3:
+        log.info("[INFO] Migrating state from v3 to v4 (compact fingerprints)...")
+        state = migrate_v3_to_v4(state)
+    
+    # Migrate to v5 if needed (epoch keys, persisted URL counts)
+    if state.get('schema_version', 1) == 4:
+        log.info("[INFO] Migrating state from v4 to v5 (epoch keys on records)...")
+        state = migrate_v4_to_v5(state)
+    
+    # Plain id lists (legacy file, default state) become ring-backed seen-sets
+    for section, capacity in STATE_ID_SETS.items():
+        if isinstance(dict.get(state, section), list):
+            state[section] = RingIdSet(capacity, state[section])
+    
     return state
 
 def create_default_state():
@@ -263,6 +487,9 @@ def create_default_state():
         "ignored_items": [],
         "sent_urls": [],
         "title_fingerprints": [],
+        "gemini_cache": [],
+        "gemini_calls": 0,
+        "outbox": [],
     }
 
 def migrate_v1_to_v2(state):
@@ -307,14 +534,44 @@ def migrate_v2_to_v3(state):
     state['slot2_remaining'] = 2
     
     state['schema_version'] = 3
-    print(f"[INFO] v2→v3 migration: cleared {old_ignored_count} ignored items, {old_digest_count} digest items")
+    log.info("[INFO] v2→v3 migration: cleared %s ignored items, %s digest items", old_ignored_count, old_digest_count)
     
     return state
 
+def migrate_v3_to_v4(state):
+    """Migrate v3 state to v4 (token lists -> compact hashed fingerprints)"""
+    # v3 regenerated the last 200 fingerprints from the sent lists every run;
+    # do it one final time for everything sent, in the compact format
+    state['title_fingerprints'] = [
+        create_title_fingerprint(item['title'], item.get('timestamp', ''))
+        for item in state.get('nuclear_sent', []) + state.get('major_sent', [])
+    ]
+    state['schema_version'] = 4
+    return state
+
+def migrate_v4_to_v5(state):
+    """Migrate v4 state to v5 (epoch 'ts' on every record, sent_urls with reference counts)"""
+    # Backfilled once here so loads and expiry never parse timestamps again
+    for section in ('nuclear_sent', 'nuclear_queue', 'major_sent', 'digest_items'):
+        for record in state.get(section, []):
+            if 'ts' not in record:
+                record['ts'] = iso_to_epoch(record['timestamp'])
+    state['sent_urls'] = Counter(
+        record['url'] for section in ('nuclear_sent', 'major_sent') for record in state.get(section, []))
+    state['schema_version'] = 5
+    return state
+
 def save_state(state):
-    """Save state to file"""
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f, indent=2)
+    """Save state, appending only the records this run changed"""
+    store = getattr(state, 'store', None) or open_state_store()
+    meta = {k: v for k, v in state.items() if k not in STATE_SECTIONS}
+    sections = {k: url_count_records(v) if isinstance(v, Counter) else v
+                for k, v in state.items() if k in STATE_SECTIONS}
+    store.write(meta, sections)
+    
+    if os.path.exists(LEGACY_STATE_FILE):
+        os.remove(LEGACY_STATE_FILE)
+        log.info("[INFO] Removed %s (state now lives in %s/)", LEGACY_STATE_FILE, STATE_DIR)
 
 # ============================================================================
 # DEDUPLICATION HELPERS
@@ -332,144 +589,456 @@ def normalize_title(title):
     title = re.sub(r'\s+', ' ', title).strip()  # Collapse whitespace
     return title
 
+def to_epoch(dt):
+    """Epoch seconds for a naive UTC datetime"""
+    return int(dt.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def iso_to_epoch(timestamp):
+    """Epoch seconds for a naive UTC ISO timestamp"""
+    return to_epoch(datetime.datetime.fromisoformat(timestamp))
+
+def title_token_hashes(title):
+    """Set of 64-bit hashes of the normalized title tokens"""
+    return set(
+        int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        for token in normalize_title(title).split()
+    )
+
+def encode_token_hashes(hashes):
+    """Pack token hashes as a sorted little-endian uint64 array in base64"""
+    packed = array('Q', sorted(hashes))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+def decode_token_hashes(encoded):
+    """Inverse of encode_token_hashes"""
+    hashes = array('Q')
+    hashes.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == 'big':
+        hashes.byteswap()
+    return hashes
+
 def create_title_fingerprint(title, timestamp):
-    """Create fingerprint for fuzzy matching"""
-    norm = normalize_title(title)
-    tokens = set(norm.split())
+    """Create fingerprint for fuzzy matching.
+
+    Computed once when an item is sent and persisted as is: `h` holds the
+    token hashes and `ts` the item's epoch time used for expiry.
+    """
+    timestamp = timestamp or datetime.datetime.utcnow().isoformat()
     return {
-        'tokens': list(tokens),  # JSON can't serialize sets
         'title': title,
-        'timestamp': timestamp or datetime.datetime.utcnow().isoformat()
+        'ts': iso_to_epoch(timestamp),
+        'h': encode_token_hashes(title_token_hashes(title)),
     }
 
-def is_fuzzy_duplicate(title, fingerprints, threshold=0.80):
-    """Check if title is fuzzy duplicate of recent items"""
-    new_norm = normalize_title(title)
-    new_tokens = set(new_norm.split())
-    
-    if len(new_tokens) == 0:
-        return False, None
-    
-    for fp in fingerprints[-200:]:  # Check last 200
-        fp_tokens = set(fp['tokens'])
-        if len(fp_tokens) == 0:
-            continue
-        
-        # Calculate Jaccard similarity (intersection / union)
-        intersection = len(new_tokens & fp_tokens)
-        union = len(new_tokens | fp_tokens)
-        similarity = intersection / union if union > 0 else 0
-        
-        if similarity >= threshold:
-            return True, fp['title']
-    
-    return False, None
+class FingerprintIndex:
+    """Inverted token index over title fingerprints for fuzzy duplicate checks.
+
+    Postings map each token to the fingerprints containing it, and token-set
+    sizes are kept alongside, so a lookup only verifies fingerprints that
+    share enough tokens with the title to possibly reach the threshold.
+    """
+
+    def __init__(self, fingerprints=(), cutoff=None):
+        self.titles = []
+        self.token_sets = []
+        self.postings = {}
+        for fp in fingerprints:
+            if cutoff is not None and fp['ts'] <= cutoff:
+                continue
+            self.add(fp)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, fingerprint):
+        """Index a fingerprint created by create_title_fingerprint"""
+        tokens = frozenset(decode_token_hashes(fingerprint['h']))
+        if not tokens:
+            return
+        entry = len(self.titles)
+        self.titles.append(fingerprint['title'])
+        self.token_sets.append(tokens)
+        for token in tokens:
+            self.postings.setdefault(token, []).append(entry)
+
+    def find_duplicate(self, tokens, threshold=FUZZY_DUP_THRESHOLD):
+        """Oldest indexed title with Jaccard similarity >= threshold, or None"""
+        size = len(tokens)
+        if size == 0:
+            return None
+
+        # J >= t needs an overlap of at least ceil(t * |A|) tokens, so any match
+        # must contain one of the |A| - ceil(t * |A|) + 1 rarest tokens of A
+        min_overlap = max(1, math.ceil(threshold * size - 1e-9))
+        probe = sorted(tokens, key=lambda tok: len(self.postings.get(tok, ())))
+        probe = probe[:size - min_overlap + 1]
+
+        candidates = set()
+        for token in probe:
+            candidates.update(self.postings.get(token, ()))
+
+        min_size = threshold * size - 1e-9
+        max_size = size / threshold + 1e-9
+        for entry in sorted(candidates):
+            fp_tokens = self.token_sets[entry]
+            fp_size = len(fp_tokens)
+            if fp_size < min_size or fp_size > max_size:
+                continue
+            
+            # Calculate Jaccard similarity (intersection / union)
+            intersection = len(tokens & fp_tokens)
+            union = size + fp_size - intersection
+            if intersection / union >= threshold:
+                return self.titles[entry]
+        return None
+
+def record_fingerprint(state, fingerprint_index, item):
+    """Fingerprint a sent item into both the persisted list and the live index"""
+    fingerprint = create_title_fingerprint(item['title'], item['timestamp'])
+    time_ordered(state, 'title_fingerprints').append(fingerprint)
+    if fingerprint_index is not None:
+        fingerprint_index.add(fingerprint)
+
+def is_fuzzy_duplicate(title, fingerprint_index, threshold=FUZZY_DUP_THRESHOLD):
+    """Check if title is fuzzy duplicate of recently sent items"""
+    similar_title = fingerprint_index.find_duplicate(title_token_hashes(title), threshold)
+    return similar_title is not None, similar_title
 
 # ============================================================================
 # AGE-BASED SCORING
 # ============================================================================
 
-def calculate_age_hours(pub_date):
+def calculate_age_hours(pub_date, now=None):
     """Calculate age in hours from publication date"""
-    current_time = datetime.datetime.utcnow()
+    current_time = now or datetime.datetime.utcnow()
     age_delta = current_time - pub_date
     return age_delta.total_seconds() / 3600
 
+RACE_RESULT_RE = re.compile(r'\b(wins?|won|victory|pole\s+position|podium)\b.*\b(grand\s+prix|race|gp|qualifying)\b', re.IGNORECASE)
+BREAKING_RE = re.compile(r'\b(crash|accident|red\s+flag|cancelled|disqualified|signs?|confirms?)\b', re.IGNORECASE)
+
 def classify_content_type(title):
     """Classify content for age decay curve selection"""
     # Race results
-    if re.search(r'\b(wins?|won|victory|pole\s+position|podium)\b.*\b(grand\s+prix|race|gp|qualifying)\b', title, re.IGNORECASE):
+    if RACE_RESULT_RE.search(title):
         return 'race_result'
     
     # Breaking news
-    if re.search(r'\b(crash|accident|red\s+flag|cancelled|disqualified|signs?|confirms?)\b', title, re.IGNORECASE):
+    if BREAKING_RE.search(title):
         return 'breaking'
     
     # Default to analysis
     return 'analysis'
 
+# Curves split into parallel (thresholds, multipliers) tuples for bisect lookups
+AGE_DECAY_TABLES = {
+    content_type: (tuple(h for h, _ in curve), tuple(m for _, m in curve))
+    for content_type, curve in AGE_DECAY_CURVES.items()
+}
+AGE_DECAY_FLOOR = 0.05  # Very old: 5% retention
+
 def get_age_decay(age_hours, content_type):
     """Get age decay multiplier based on content type"""
-    curve = AGE_DECAY_CURVES.get(content_type, AGE_DECAY_CURVES['breaking'])
-    
-    for hour_threshold, multiplier in curve:
-        if age_hours < hour_threshold:
-            return multiplier
-    
-    return 0.05  # Very old: 5% retention
+    thresholds, multipliers = AGE_DECAY_TABLES.get(content_type, AGE_DECAY_TABLES['breaking'])
+    index = bisect.bisect_right(thresholds, age_hours)
+    if index < len(multipliers):
+        return multipliers[index]
+    return AGE_DECAY_FLOOR
 
 # ============================================================================
 # PATTERN MATCHING & SCORING
 # ============================================================================
 
+class _Rule:
+    """A single compiled pattern from one of the rule tables"""
+    __slots__ = ('rule_id', 'points', 'pattern', 'regex', 'keyword_groups')
+
+    def __init__(self, rule_id, points, pattern):
+        self.rule_id = rule_id
+        self.points = points
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.IGNORECASE)
+        self.keyword_groups = _required_keyword_groups(pattern)
+
+
+# Characters that IGNORECASE matches against ASCII letters but that
+# str.lower() does not map onto them
+_CASEFOLD_FIXUPS = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _leading_literals(items):
+    """Literal prefixes one of which every match of `items` must start with (None if unknown)"""
+    if not items:
+        return None
+    op, av = items[0]
+    if op is _sre_parse.LITERAL:
+        run = []
+        for op, av in items:
+            if op is not _sre_parse.LITERAL:
+                break
+            char = chr(av).lower()
+            if not re.match(r'\w', char):
+                break
+            run.append(char)
+        return {''.join(run)} if run else None
+    if op is _sre_parse.SUBPATTERN:
+        return _leading_literals(list(av[-1]))
+    if op is _sre_parse.BRANCH:
+        prefixes = set()
+        for branch in av[1]:
+            branch_prefixes = _leading_literals(list(branch))
+            if branch_prefixes is None:
+                return None
+            prefixes |= branch_prefixes
+        return prefixes
+    if op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT) and av[0] >= 1:
+        return _leading_literals(list(av[2]))
+    return None
+
+
+def _is_word_start_anchor(op, av):
+    """True if the element guarantees the next character starts a \\w+ token"""
+    if op is _sre_parse.AT:
+        return av in (_sre_parse.AT_BOUNDARY, _sre_parse.AT_BEGINNING, _sre_parse.AT_BEGINNING_STRING)
+    if op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT) and av[0] >= 1:
+        return list(av[2]) == [(_sre_parse.IN, [(_sre_parse.CATEGORY, _sre_parse.CATEGORY_SPACE)])]
+    return False
+
+
+def _required_keyword_groups(pattern):
+    """Derive keyword prefilters for a pattern.
+
+    Returns a list of keyword sets. Every match of the pattern contains, for
+    each set, a word starting with one of its keywords, so a title failing
+    any set can skip the regex entirely. Elements we can't reason about are
+    simply not used as prefilters.
+    """
+    try:
+        items = list(_sre_parse.parse(pattern, re.IGNORECASE))
+    except Exception:
+        return []
+
+    groups = []
+    for index in range(1, len(items)):
+        prev_op, prev_av = items[index - 1]
+        op, av = items[index]
+        if not _is_word_start_anchor(prev_op, prev_av):
+            continue
+        if op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT):
+            continue  # Optional or repeated elements are not reliable anchors
+        keywords = _leading_literals(items[index:])
+        if keywords:
+            groups.append(frozenset(keywords))
+    return groups
+
+
+class CompiledScorer:
+    """Headline scorer with every rule table compiled once.
+
+    Titles are tokenized once and checked against keyword prefilters derived
+    from each pattern; only rules whose keywords are all present run their
+    (often `.*`-pair) regex. Results are identical to searching every
+    pattern in turn.
+    """
+
+    def __init__(self, nuclear_patterns=None, nuclear_disqualifiers=None, major_patterns=None,
+                 medium_patterns=None, broad_patterns=None, negative_patterns=None,
+                 reject_patterns=None, digest_disqualifiers=None):
+        self.nuclear = self._compile_table('nuclear', [(NUCLEAR_SCORE, p) for p in _default(nuclear_patterns, NUCLEAR_PATTERNS)])
+        self.nuclear_disqualifiers = self._compile_table('nuclear_disq', [(0, p) for p in _default(nuclear_disqualifiers, NUCLEAR_DISQUALIFIERS)])
+        self.scored = (
+            self._compile_table('major', _default(major_patterns, MAJOR_PATTERNS))
+            + self._compile_table('medium', _default(medium_patterns, MEDIUM_PATTERNS))
+            + self._compile_table('broad', _default(broad_patterns, BROAD_PATTERNS))
+            + self._compile_table('negative', _default(negative_patterns, NEGATIVE_PATTERNS))
+        )
+        self.reject = self._compile_table('reject', [(0, p) for p in _default(reject_patterns, UNIVERSAL_REJECT_PATTERNS)])
+        self.digest_disqualifiers = self._compile_table('digest_disq', [(0, p) for p in _default(digest_disqualifiers, DIGEST_DISQUALIFIERS)])
+
+        # table name -> keyword -> [(rule index, group bit)]; a rule is a
+        # candidate once the bits of all its keyword groups are set
+        self._tables = {
+            'nuclear': self.nuclear,
+            'nuclear_disq': self.nuclear_disqualifiers,
+            'scored': self.scored,
+            'reject': self.reject,
+            'digest_disq': self.digest_disqualifiers,
+        }
+        self._keyword_index = {}
+        self._unfiltered = {}
+        all_keywords = set()
+        for table_name, table in self._tables.items():
+            table_index = self._keyword_index[table_name] = {}
+            self._unfiltered[table_name] = [i for i, rule in enumerate(table) if not rule.keyword_groups]
+            for rule_index, rule in enumerate(table):
+                for group_index, keywords in enumerate(rule.keyword_groups):
+                    for keyword in keywords:
+                        table_index.setdefault(keyword, []).append((rule_index, 1 << group_index))
+                        all_keywords.add(keyword)
+        self._all_keywords = frozenset(all_keywords)
+        self._keyword_lengths = sorted(set(len(k) for k in all_keywords))
+
+    @staticmethod
+    def _compile_table(kind, table):
+        return [_Rule(f"{kind}:{i}", points, pattern) for i, (points, pattern) in enumerate(table)]
+
+    def _found_keywords(self, title):
+        """Set of prefilter keywords that start some word of the title"""
+        lowered = title.translate(_CASEFOLD_FIXUPS).lower()
+        keywords = self._all_keywords
+        lengths = self._keyword_lengths
+        found = set()
+        for token in set(_TOKEN_RE.findall(lowered)):
+            token_len = len(token)
+            for length in lengths:
+                if length > token_len:
+                    break
+                prefix = token[:length]
+                if prefix in keywords:
+                    found.add(prefix)
+        return found
+
+    def _candidates(self, table_name, found):
+        """Rules of a table (in table order) whose prefilters are all satisfied"""
+        table = self._tables[table_name]
+        table_index = self._keyword_index[table_name]
+        masks = {}
+        for keyword in found:
+            for rule_index, bit in table_index.get(keyword, ()):
+                masks[rule_index] = masks.get(rule_index, 0) | bit
+        indices = [
+            rule_index for rule_index, mask in masks.items()
+            if mask == (1 << len(table[rule_index].keyword_groups)) - 1
+        ]
+        indices.extend(self._unfiltered[table_name])
+        indices.sort()
+        return [table[rule_index] for rule_index in indices]
+
+    def _first_match(self, table_name, title, found):
+        for rule in self._candidates(table_name, found):
+            if rule.regex.search(title):
+                return rule
+        return None
+
+    def evaluate(self, title, found=None):
+        """Score a title, returning (score, category, matched rules)"""
+        if found is None:
+            found = self._found_keywords(title)
+
+        matched = []
+        nuclear_hits = [rule for rule in self._candidates('nuclear', found) if rule.regex.search(title)]
+        if nuclear_hits:
+            matched.extend(nuclear_hits)
+            disqualifier = self._first_match('nuclear_disq', title, found)
+            if disqualifier is None:
+                return NUCLEAR_SCORE, "nuclear", matched
+            matched.append(disqualifier)
+
+        score = 0
+        for rule in self._candidates('scored', found):
+            if rule.regex.search(title):
+                matched.append(rule)
+                score += rule.points
+
+        if score >= MAJOR_THRESHOLD:
+            category = "major"
+        elif score >= DIGEST_THRESHOLD:
+            category = "digest"
+        else:
+            category = "ignore"
+        return score, category, matched
+
+    def score(self, title):
+        """Score a title, returning (score, category) like score_headline"""
+        score, category, _ = self.evaluate(title)
+        return score, category
+
+    def reject_rule(self, title):
+        """First universal reject rule matching the title, or None"""
+        return self._first_match('reject', title, self._found_keywords(title))
+
+    def digest_disqualifier(self, title):
+        """First digest disqualifier matching the title, or None"""
+        return self._first_match('digest_disq', title, self._found_keywords(title))
+
+    def rules(self):
+        """Every rule of every table, in table order"""
+        return [rule for table in self._tables.values() for rule in table]
+
+    def matching_rules(self, title):
+        """Every rule of every table that matches the title (for offline rule analysis)"""
+        found = self._found_keywords(title)
+        return [
+            rule for table_name in self._tables
+            for rule in self._candidates(table_name, found) if rule.regex.search(title)
+        ]
+
+
+def _default(value, fallback):
+    return fallback if value is None else value
+
+
+SCORER = CompiledScorer()
+
+
 def check_universal_reject(title):
     """Check if title should be universally rejected"""
-    for pattern in UNIVERSAL_REJECT_PATTERNS:
-        if re.search(pattern, title, re.IGNORECASE):
-            return True, pattern
+    rule = SCORER.reject_rule(title)
+    if rule is not None:
+        return True, rule.pattern
     return False, None
 
-def score_headline(title):
-    """Get base score from pattern matching (no age applied yet)"""
-    print(f"  [DEBUG] Scoring: '{title}'")
-    
-    # Check nuclear patterns first
-    for pattern in NUCLEAR_PATTERNS:
-        if re.search(pattern, title, re.IGNORECASE):
-            print(f"    [MATCH] Nuclear pattern: '{pattern}'")
-            
-            # Check nuclear disqualifiers
-            for disq_pattern in NUCLEAR_DISQUALIFIERS:
-                if re.search(disq_pattern, title, re.IGNORECASE):
-                    print(f"    [DEMOTE] Nuclear disqualified by: '{disq_pattern}'")
-                    # Fall through to major scoring
-                    break
+def score_headline(title, matched_rules=None):
+    """Get base score from pattern matching (no age applied yet).
+
+    Rule ids of the matching patterns are appended to matched_rules if given.
+    """
+    score, category, matched = SCORER.evaluate(title)
+    if matched_rules is not None:
+        matched_rules.extend(rule.rule_id for rule in matched)
+    
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("  [DEBUG] Scoring: '%s'", title)
+        for rule in matched:
+            kind = rule.rule_id.split(':', 1)[0]
+            if kind == 'nuclear':
+                log.debug("    [MATCH] Nuclear pattern: '%s'", rule.pattern)
+            elif kind == 'nuclear_disq':
+                log.debug("    [DEMOTE] Nuclear disqualified by: '%s'", rule.pattern)
             else:
-                # No disqualifier matched, keep as nuclear
-                return NUCLEAR_SCORE, "nuclear"
-    
-    # Major/Medium/Broad scoring
-    score = 0
-    
-    for points, pattern in MAJOR_PATTERNS:
-        if re.search(pattern, title, re.IGNORECASE):
-            print(f"    [MATCH] Major pattern ({points} pts): '{pattern}'")
-            score += points
-    
-    for points, pattern in MEDIUM_PATTERNS:
-        if re.search(pattern, title, re.IGNORECASE):
-            print(f"    [MATCH] Medium pattern ({points} pts): '{pattern}'")
-            score += points
-    
-    for points, pattern in BROAD_PATTERNS:
-        if re.search(pattern, title, re.IGNORECASE):
-            print(f"    [MATCH] Broad pattern ({points} pts): '{pattern}'")
-            score += points
-    
-    # Negative patterns
-    for points, pattern in NEGATIVE_PATTERNS:
-        if re.search(pattern, title, re.IGNORECASE):
-            print(f"    [MATCH] Negative pattern ({points} pts): '{pattern}'")
-            score += points
-    
-    # Determine category from base score
-    if score >= MAJOR_THRESHOLD:
-        category = "major"
-    elif score >= DIGEST_THRESHOLD:
-        category = "digest"
-    else:
-        category = "ignore"
-    
-    print(f"    [RESULT] Base Score: {score} | Category: {category}")
+                log.debug("    [MATCH] %s pattern (%s pts): '%s'", kind.capitalize(), rule.points, rule.pattern)
+        if category != "nuclear":
+            log.debug("    [RESULT] Base Score: %s | Category: %s", score, category)
     return score, category
 
-def score_with_age(title, pub_date):
-    """Score headline with age decay applied"""
+def final_score_category(final_score):
+    """Category for an age-decayed score (before digest disqualifiers)"""
+    if final_score >= NUCLEAR_SCORE:
+        return "nuclear"
+    elif final_score >= MAJOR_THRESHOLD:
+        return "major"
+    elif final_score >= DIGEST_THRESHOLD:
+        return "digest"
+    elif final_score >= MINIMUM_SCORE:
+        return "ignore"
+    else:
+        return "hard_ignore"  # Below minimum, don't even track
+
+def score_with_age(title, pub_date, now=None, details=None):
+    """Score headline with age decay applied.
+
+    If details is a dict it is filled with the matched rule ids, base
+    score, content type and decay multiplier (for the run trace).
+    """
     # Get base score
-    base_score, base_category = score_headline(title)
+    matched_rules = [] if details is not None else None
+    base_score, base_category = score_headline(title, matched_rules)
     
     # Calculate age
-    age_hours = calculate_age_hours(pub_date)
+    age_hours = calculate_age_hours(pub_date, now)
     
     # Classify content type
     content_type = classify_content_type(title)
@@ -478,32 +1047,78 @@ def score_with_age(title, pub_date):
     decay_multiplier = get_age_decay(age_hours, content_type)
     final_score = base_score * decay_multiplier
     
-    print(f"  [AGE] {age_hours:.1f}h old | Type: {content_type} | Decay: {decay_multiplier:.2f}")
-    print(f"  [AGE] Base: {base_score} → Final: {final_score:.0f}")
+    log.debug("  [AGE] %.1fh old | Type: %s | Decay: %.2f", age_hours, content_type, decay_multiplier)
+    log.debug("  [AGE] Base: %s → Final: %.0f", base_score, final_score)
     
     # Re-categorize based on final score
-    if final_score >= NUCLEAR_SCORE:
-        final_category = "nuclear"
-    elif final_score >= MAJOR_THRESHOLD:
-        final_category = "major"
-    elif final_score >= DIGEST_THRESHOLD:
-        final_category = "digest"
-    elif final_score >= MINIMUM_SCORE:
-        final_category = "ignore"
-    else:
-        final_category = "hard_ignore"  # Below minimum, don't even track
+    final_category = final_score_category(final_score)
     
     # Apply digest disqualifiers
     if final_category == "digest":
-        for disq_pattern in DIGEST_DISQUALIFIERS:
-            if re.search(disq_pattern, title, re.IGNORECASE):
-                print(f"    [IGNORE] Digest disqualified by: '{disq_pattern}'")
-                final_category = "ignore"
-                break
-    
+        disq_rule = SCORER.digest_disqualifier(title)
+        if disq_rule is not None:
+            log.debug("    [IGNORE] Digest disqualified by: '%s'", disq_rule.pattern)
+            final_category = "ignore"
+            if matched_rules is not None:
+                matched_rules.append(disq_rule.rule_id)
+    
+    if details is not None:
+        details.update(rules=matched_rules, base=base_score, type=content_type,
+                       decay=round(decay_multiplier, 3))
     return final_score, final_category
 
+BatchScores = namedtuple('BatchScores', ['base_scores', 'decay', 'final_scores', 'categories'])
+
+def score_batch(items, now=None):
+    """Score many (title, pub_date) pairs at once.
 
+    Quiet equivalent of calling score_with_age on each item: titles are
+    scored once per distinct title, ages are computed against a single
+    `now`, and decay lookups are done per content type over the whole batch.
+    Returns BatchScores of parallel arrays in input order.
+    """
+    now = now or datetime.datetime.utcnow()
+    titles = []
+    ages = array('d')
+    for title, pub_date in items:
+        titles.append(title)
+        ages.append((now - pub_date).total_seconds() / 3600)
+    
+    # Base score and content type per distinct title
+    base_by_title = {}
+    type_by_title = {}
+    for title in titles:
+        if title not in base_by_title:
+            base_by_title[title] = SCORER.score(title)[0]
+            type_by_title[title] = classify_content_type(title)
+    
+    base_scores = array('i', (base_by_title[t] for t in titles))
+    
+    # Decay: one bisect pass per content-type curve
+    decay = array('d', bytes(8 * len(titles)))
+    positions_by_type = {}
+    for position, title in enumerate(titles):
+        positions_by_type.setdefault(type_by_title[title], []).append(position)
+    for content_type, positions in positions_by_type.items():
+        thresholds, multipliers = AGE_DECAY_TABLES.get(content_type, AGE_DECAY_TABLES['breaking'])
+        lookup = multipliers + (AGE_DECAY_FLOOR,)
+        for position in positions:
+            decay[position] = lookup[bisect.bisect_right(thresholds, ages[position])]
+    
+    final_scores = array('d', (b * d for b, d in zip(base_scores, decay)))
+    
+    categories = []
+    disqualified = {}
+    for title, final_score in zip(titles, final_scores):
+        category = final_score_category(final_score)
+        if category == "digest":
+            if title not in disqualified:
+                disqualified[title] = SCORER.digest_disqualifier(title) is not None
+            if disqualified[title]:
+                category = "ignore"
+        categories.append(category)
+    
+    return BatchScores(base_scores, decay, final_scores, categories)
 
 def contains_specific_f1_entity(text):
     """Check whether text references a specific F1 entity."""
@@ -529,17 +1144,35 @@ def is_state_change_event(text):
     return bool(state_change_pattern.search(text or ""))
 
 
-def validate_nuclear_event(title, summary):
-    """Validate if a potential nuclear headline is confirmed and high-impact.
-
-    Returns:
-        dict: {
-            "confirmed": bool,
-            "impact": "high"|"medium"|"low",
-            "reason": str,
-            "demote_to": "major"|"digest"|None
-        }
-    """
+def gemini_cache_key(title, summary):
+    """Cache key: normalized title plus a hash of the whitespace-collapsed summary"""
+    summary_hash = hashlib.sha256(" ".join((summary or "").lower().split()).encode('utf-8')).hexdigest()[:16]
+    return hashlib.sha256(f"{normalize_title(title or '')}|{summary_hash}".encode('utf-8')).hexdigest()[:32]
+
+def gemini_cache_entries(state):
+    """The state's Gemini verdict cache (created on first use)"""
+    entries = state.get('gemini_cache')
+    if entries is None:
+        entries = state['gemini_cache'] = []
+    return entries
+
+def lookup_gemini_verdict(state, key, now_epoch):
+    """Cached verdict for `key` if it is still within the TTL"""
+    cutoff = now_epoch - GEMINI_CACHE_TTL_HOURS * 3600
+    for entry in gemini_cache_entries(state):
+        if entry['id'] == key and entry['ts'] >= cutoff:
+            return entry['verdict']
+    return None
+
+def store_gemini_verdict(state, key, verdict, now_epoch):
+    """Cache a verdict, dropping expired entries and the oldest beyond the cap"""
+    cutoff = now_epoch - GEMINI_CACHE_TTL_HOURS * 3600
+    entries = [e for e in gemini_cache_entries(state) if e['ts'] >= cutoff and e['id'] != key]
+    entries.append({'id': key, 'ts': now_epoch, 'verdict': verdict})
+    state['gemini_cache'] = entries[-GEMINI_CACHE_MAX_ENTRIES:]
+
+def guardrail_verdict(title, summary):
+    """Verdict from the deterministic checks alone, or None if Gemini should decide"""
     combined = f"{title or ''}\n{summary or ''}".strip()
 
     # Fast deterministic guardrails before API call
@@ -575,35 +1208,244 @@ def validate_nuclear_event(title, summary):
             "reason": "Gemini key missing; deterministic checks passed",
             "demote_to": None,
         }
+    return None
 
-    prompt = f"""
-You are validating Formula 1 breaking-news headlines for urgent alerts.
-Decide if this item is confirmed and high-impact enough for an immediate top-priority alert.
+def guardrails_passed_verdict(reason):
+    """Verdict used when Gemini is skipped after the guardrails passed"""
+    return {
+        "confirmed": True,
+        "impact": "high",
+        "reason": reason,
+        "demote_to": None,
+    }
 
-Headline: {title}
-Summary: {summary}
+def validate_nuclear_event(title, summary, state=None, now=None):
+    """Validate if a potential nuclear headline is confirmed and high-impact.
+
+    With a state, Gemini verdicts are cached there and calls are counted
+    against GEMINI_MAX_DAILY_CALLS; once the budget is spent the
+    deterministic guardrails decide alone.
 
+    Returns:
+        dict: {
+            "confirmed": bool,
+            "impact": "high"|"medium"|"low",
+            "reason": str,
+            "demote_to": "major"|"digest"|None
+        }
+    """
+    verdict = guardrail_verdict(title, summary)
+    if verdict is not None:
+        return verdict
+
+    if state is None:
+        return request_gemini_verdict(title, summary)
+
+    now_epoch = to_epoch(now or datetime.datetime.utcnow())
+    cache_key = gemini_cache_key(title, summary)
+    cached = lookup_gemini_verdict(state, cache_key, now_epoch)
+    if cached is not None:
+        log.debug("  [AI CACHE] Reusing Gemini verdict")
+        return cached
+
+    if state.get('gemini_calls', 0) >= GEMINI_MAX_DAILY_CALLS:
+        return guardrails_passed_verdict(f"Gemini daily budget ({GEMINI_MAX_DAILY_CALLS}) spent; deterministic checks passed")
+
+    # Counted before the call: failed and timed-out requests still use quota
+    state['gemini_calls'] = state.get('gemini_calls', 0) + 1
+    verdict = request_gemini_verdict(title, summary)
+    store_gemini_verdict(state, cache_key, verdict, now_epoch)
+    return verdict
+
+def validate_nuclear_events(headlines, state, now=None):
+    """Validate several (title, summary) nuclear candidates with one Gemini request.
+
+    Guardrails and the cache are applied per headline first; whatever is
+    left goes out as a single batched prompt. A malformed batch response
+    falls back to validate_nuclear_event per headline. Returns one verdict
+    per headline, or None where validation was unavailable (the caller
+    keeps the regex score).
+    """
+    now_epoch = to_epoch(now or datetime.datetime.utcnow())
+    verdicts = [guardrail_verdict(title, summary) for title, summary in headlines]
+    pending = []
+    for index, (title, summary) in enumerate(headlines):
+        if verdicts[index] is not None:
+            continue
+        cache_key = gemini_cache_key(title, summary)
+        verdicts[index] = lookup_gemini_verdict(state, cache_key, now_epoch)
+        if verdicts[index] is None:
+            pending.append((index, cache_key))
+    if not pending:
+        return verdicts
+
+    if state.get('gemini_calls', 0) >= GEMINI_MAX_DAILY_CALLS:
+        for index, _ in pending:
+            verdicts[index] = guardrails_passed_verdict(f"Gemini daily budget ({GEMINI_MAX_DAILY_CALLS}) spent; deterministic checks passed")
+        return verdicts
+
+    state['gemini_calls'] = state.get('gemini_calls', 0) + 1
+    try:
+        batch = request_gemini_verdicts([headlines[index] for index, _ in pending])
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        log.warning("  [AI BATCH] Malformed batch response (%s); validating %s headlines one by one", e, len(pending))
+        batch = None
+    except Exception as e:
+        log.warning("  [AI FALLBACK] Batch validation unavailable: %s", e)
+        return verdicts
+
+    for position, (index, cache_key) in enumerate(pending):
+        if batch is not None:
+            verdicts[index] = batch[position]
+            store_gemini_verdict(state, cache_key, verdicts[index], now_epoch)
+            continue
+        try:
+            verdicts[index] = validate_nuclear_event(*headlines[index], state=state, now=now)
+        except Exception as e:
+            log.warning("  [AI FALLBACK] Validation unavailable for '%s': %s", headlines[index][0], e)
+    return verdicts
+
+class _ValidationScratch(dict):
+    """Per-batch state for validate_nuclear_events.
+
+    The Gemini cache is a private copy; 'gemini_calls' reads and writes go
+    straight to the validator's state under its lock, so a call is counted
+    before it is sent.
+    """
+
+    def __init__(self, validator, **fields):
+        super().__init__(fields)
+        self._validator = validator
+
+    def __getitem__(self, key):
+        if key == 'gemini_calls':
+            with self._validator._lock:
+                return self._validator.state.get('gemini_calls', 0)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key == 'gemini_calls' or key in self else default
+
+    def __setitem__(self, key, value):
+        if key == 'gemini_calls':
+            with self._validator._lock:
+                self._validator.state['gemini_calls'] = value
+            return
+        super().__setitem__(key, value)
+
+class NuclearValidator:
+    """Validate nuclear candidates on a background thread while the run continues.
+
+    Submitted candidates are micro-batched (whatever arrives within
+    batch_window of the first one goes out together) and validated with
+    validate_nuclear_events. Everything shares one run-wide deadline:
+    results() waits for it at most, and candidates still unresolved then
+    get the deterministic-guardrail verdict, so a slow LLM endpoint cannot
+    stretch the run.
+
+    Each batch works on a scratch copy of the Gemini cache that is merged
+    back into the state only while the validator is open, so the verdicts
+    and cache entries of a request that outlives the deadline are dropped.
+    Calls are charged to the state's daily counter as they are made, so
+    late and abandoned requests still count against the budget.
+    """
+
+    def __init__(self, state, now=None, deadline_seconds=NUCLEAR_VALIDATION_DEADLINE_SECONDS,
+                 batch_window=NUCLEAR_VALIDATION_BATCH_WINDOW):
+        self.state = state
+        self.now = now
+        self.deadline = time.monotonic() + deadline_seconds
+        self.batch_window = batch_window
+        self._submitted = []  # (headline, summary)
+        self._verdicts = {}   # submission index -> verdict (None: validation unavailable)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+    def __len__(self):
+        return len(self._submitted)
+
+    def submit(self, headline, summary):
+        self._submitted.append((headline, summary))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._queue.put(len(self._submitted) - 1)
+
+    def _run(self):
+        finished = False
+        while not finished:
+            index = self._queue.get()
+            if index is None:
+                return
+            batch = [index]
+            window_end = time.monotonic() + self.batch_window
+            while True:
+                try:
+                    index = self._queue.get(timeout=max(0.0, window_end - time.monotonic()))
+                except queue.Empty:
+                    break
+                if index is None:
+                    finished = True
+                    break
+                batch.append(index)
+            self._validate(batch)
+
+    def _validate(self, batch):
+        with self._lock:
+            if self._closed:
+                return
+            scratch = _ValidationScratch(self, gemini_cache=list(gemini_cache_entries(self.state)))
+        headlines = [(self._submitted[i][0].title, self._submitted[i][1]) for i in batch]
+        try:
+            verdicts = validate_nuclear_events(headlines, scratch, self.now)
+        except Exception as e:
+            log.warning("  [AI FALLBACK] Nuclear validation failed: %s", e)
+            verdicts = [None] * len(batch)
+        with self._lock:
+            if self._closed:
+                return
+            self.state['gemini_cache'] = scratch['gemini_cache']
+            self._verdicts.update(zip(batch, verdicts))
+
+    def results(self):
+        """[(headline, verdict)] in submission order, waiting no later than the deadline"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(max(0.0, self.deadline - time.monotonic()))
+        with self._lock:
+            self._closed = True
+            verdicts = dict(self._verdicts)
+
+        results = []
+        for index, (headline, summary) in enumerate(self._submitted):
+            if index not in verdicts:
+                log.warning("  [AI TIMEOUT] Validation deadline reached for '%s'", headline.title)
+                verdicts[index] = guardrail_verdict(headline.title, summary) or guardrails_passed_verdict(
+                    "Validation deadline reached; deterministic checks passed")
+            results.append((headline, verdicts[index]))
+        return results
+
+GEMINI_RULES = """
 Rules:
 1) Must include a specific F1 entity (driver/team/FIA).
 2) Reject speculative or uncertain phrasing (e.g., could, might, rumored, suggests, reports claim).
 3) Must be a state-change event (signing, retirement, penalty, disqualification, official appointment/removal, confirmed withdrawal).
-
-Return STRICT JSON only with keys:
-- confirmed (boolean)
-- impact ("high"|"medium"|"low")
-- reason (short string)
 """.strip()
 
+def post_gemini_prompt(prompt, max_output_tokens):
+    """Send a JSON-mode prompt and return the decoded JSON reply"""
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {
             "temperature": 0,
-            "maxOutputTokens": 180,
+            "maxOutputTokens": max_output_tokens,
             "responseMimeType": "application/json",
         },
     }
 
-    response = requests.post(
+    response = http_session().post(
         GEMINI_API_URL,
         params={"key": GEMINI_API_KEY},
         json=payload,
@@ -619,8 +1461,9 @@ Return STRICT JSON only with keys:
         .get("text", "")
         .strip()
     )
-    parsed = json.loads(text_response)
+    return json.loads(text_response)
 
+def verdict_from_reply(parsed):
     confirmed = bool(parsed.get("confirmed", False))
     impact = parsed.get("impact", "low")
     reason = parsed.get("reason", "Gemini validation")
@@ -636,42 +1479,393 @@ Return STRICT JSON only with keys:
         "demote_to": demote_to,
     }
 
+def request_gemini_verdict(title, summary):
+    """Ask Gemini whether the headline is a confirmed, high-impact state change"""
+    prompt = f"""
+You are validating Formula 1 breaking-news headlines for urgent alerts.
+Decide if this item is confirmed and high-impact enough for an immediate top-priority alert.
+
+Headline: {title}
+Summary: {summary}
+
+{GEMINI_RULES}
+
+Return STRICT JSON only with keys:
+- confirmed (boolean)
+- impact ("high"|"medium"|"low")
+- reason (short string)
+""".strip()
+
+    return verdict_from_reply(post_gemini_prompt(prompt, 180))
+
+def request_gemini_verdicts(headlines):
+    """One Gemini request for several (title, summary) pairs; raises ValueError on a malformed reply"""
+    listing = "\n\n".join(
+        f"[{index}] Headline: {title}\n    Summary: {summary}"
+        for index, (title, summary) in enumerate(headlines)
+    )
+    prompt = f"""
+You are validating Formula 1 breaking-news headlines for urgent alerts.
+For each numbered item, decide if it is confirmed and high-impact enough for an immediate top-priority alert.
+
+{listing}
+
+{GEMINI_RULES}
+
+Return STRICT JSON only: an array with exactly one object per item, each with keys:
+- index (integer, the item number)
+- confirmed (boolean)
+- impact ("high"|"medium"|"low")
+- reason (short string)
+""".strip()
+
+    parsed = post_gemini_prompt(prompt, 180 * len(headlines))
+    if not isinstance(parsed, list):
+        raise ValueError("expected a JSON array")
+    by_index = {}
+    for position, entry in enumerate(parsed):
+        if not isinstance(entry, dict) or "confirmed" not in entry:
+            raise ValueError(f"entry {position} has no verdict")
+        by_index[entry.get("index", position)] = verdict_from_reply(entry)
+    if sorted(by_index) != list(range(len(headlines))):
+        raise ValueError(f"expected verdicts for items 0..{len(headlines) - 1}, got {sorted(by_index)}")
+    return [by_index[index] for index in range(len(headlines))]
+
 # ============================================================================
-# FIREBASE & NOTIFICATIONS
+# FEED FETCHING
 # ============================================================================
 
-def init_firebase():
-    """Initialize Firebase"""
-    cred_json = os.environ.get("FIREBASE_CREDENTIALS")
-    if cred_json:
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+FEED_ITEM_TAGS = ('item', ATOM_NS + 'entry')
+
+FeedItem = namedtuple('FeedItem', ['title', 'link', 'guid', 'pub_date_str', 'summary', 'image_url', 'source'])
+
+def feed_sources():
+    """Feeds to ingest: NOTIFICATION_FEEDS ("url[|timeout],...") or FEED_SOURCES"""
+    spec = os.environ.get('NOTIFICATION_FEEDS', '').strip()
+    if not spec:
+        return FEED_SOURCES
+    sources = []
+    for entry in spec.split(','):
+        url, _, timeout = entry.strip().partition('|')
+        if url:
+            sources.append({'url': url, 'timeout': float(timeout) if timeout else FEED_TIMEOUT_SECONDS})
+    return sources
+
+_HTTP_SESSION = None
+
+def http_session():
+    """Shared keep-alive session for feed and Gemini requests"""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        import requests  # Deferred: only runs that fetch or validate need it
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+def fetch_feed(url, cache_entry, stream=False, timeout=FEED_TIMEOUT_SECONDS):
+    """Fetch a feed, reusing the validators and content hash from the last run.
+
+    Returns (chunks, cache_entry) where chunks is an iterable of body bytes,
+    or None when the server answered 304 Not Modified or sent byte-identical
+    content. With stream=True the body is read lazily as chunks are consumed;
+    streamed bodies are not hashed, so only 304s and the high-water mark
+    avoid reprocessing them.
+    """
+    headers = {}
+    if cache_entry.get('etag'):
+        headers['If-None-Match'] = cache_entry['etag']
+    if cache_entry.get('last_modified'):
+        headers['If-Modified-Since'] = cache_entry['last_modified']
+    
+    response = http_session().get(url, headers=headers, timeout=timeout, stream=stream)
+    if response.status_code == 304:
+        log.info("[INFO] %s: not modified (304)", url)
+        response.close()
+        return None, cache_entry
+    response.raise_for_status()
+    
+    new_entry = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    if stream:
+        return _stream_body(response), new_entry
+    
+    new_entry['content_hash'] = hashlib.sha256(response.content).hexdigest()
+    if new_entry['content_hash'] == cache_entry.get('content_hash'):
+        log.info("[INFO] %s: content identical to last run", url)
+        return None, new_entry
+    return [response.content], new_entry
+
+def _stream_body(response, chunk_size=16384):
+    """Yield the response body in chunks, closing the connection when done"""
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            yield chunk
+    finally:
+        response.close()
+
+class FeedItemStream:
+    """Incrementally parse RSS items (or Atom entries) out of body chunks.
+
+    Each item is turned into a FeedItem as soon as its end tag arrives and
+    then dropped from the tree, so memory stays flat however large the feed
+    is. A parse or transport error ends the stream early and is kept in
+    `error` so the caller can avoid advancing its bookkeeping.
+    """
+
+    def __init__(self, chunks, source=None):
+        self.chunks = chunks
+        self.source = source
+        self.count = 0
+        self.error = None
+
+    def __iter__(self):
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        parents = []
         try:
-            cred_dict = json.loads(cred_json)
-            cred = credentials.Certificate(cred_dict)
-            firebase_admin.initialize_app(cred)
-            print("[INFO] Firebase initialized successfully.")
-            return True
+            for chunk in self.chunks:
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        parents.append(elem)
+                        continue
+                    parents.pop()
+                    if elem.tag not in FEED_ITEM_TAGS:
+                        continue
+                    record = _feed_item_from_element(elem, self.source)
+                    if parents:
+                        parents[-1].remove(elem)
+                    self.count += 1
+                    yield record
+            parser.close()
         except Exception as e:
-            print(f"[ERROR] Error initializing Firebase: {e}")
-            return False
-    else:
-        print("[ERROR] FIREBASE_CREDENTIALS env var not found.")
+            self.error = e
+            log.error("[ERROR] Feed parse failed after %s items from %s: %s", self.count, self.source, e)
+        finally:
+            close = getattr(self.chunks, 'close', None)
+            if close is not None:
+                close()
+
+def _feed_item_from_element(elem, source=None):
+    if elem.tag == 'item':
+        title = elem.findtext('title')
+        link = elem.findtext('link')
+        enclosure = elem.find('enclosure')
+        return FeedItem(
+            title=title,
+            link=link,
+            guid=elem.findtext('guid') or link,
+            pub_date_str=elem.findtext('pubDate'),
+            summary=elem.findtext('description') or "",
+            image_url=enclosure.get('url') if enclosure is not None else None,
+            source=source,
+        )
+    
+    # Atom entry
+    link, image_url = None, None
+    for link_elem in elem.findall(ATOM_NS + 'link'):
+        rel = link_elem.get('rel', 'alternate')
+        if rel == 'alternate' and link is None:
+            link = link_elem.get('href')
+        elif rel == 'enclosure' and image_url is None:
+            image_url = link_elem.get('href')
+    return FeedItem(
+        title=elem.findtext(ATOM_NS + 'title'),
+        link=link,
+        guid=elem.findtext(ATOM_NS + 'id') or link,
+        pub_date_str=elem.findtext(ATOM_NS + 'published') or elem.findtext(ATOM_NS + 'updated'),
+        summary=elem.findtext(ATOM_NS + 'summary') or elem.findtext(ATOM_NS + 'content') or "",
+        image_url=image_url,
+        source=source,
+    )
+
+def parse_pub_date(pub_date_str):
+    """Naive UTC datetime from an RFC 822 (RSS) or ISO 8601 (Atom) date"""
+    try:
+        parsed = email.utils.parsedate_to_datetime(pub_date_str)
+    except (TypeError, ValueError):
+        parsed = datetime.datetime.fromisoformat(pub_date_str.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def archive_feed_body(url, chunks, directory=None, captured=None):
+    """Save a fetched body as <dir>/<url slug>/<capture time>.xml (what the replay tool reads)"""
+    directory = directory or FEED_ARCHIVE_DIR
+    captured = captured or datetime.datetime.utcnow()
+    slug = re.sub(r'[^A-Za-z0-9.-]+', '_', url.split('://', 1)[-1]).strip('_')
+    path = os.path.join(directory, slug, captured.strftime('%Y%m%dT%H%M%SZ') + '.xml')
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b"".join(chunks))
+    except OSError as e:
+        log.warning("[WARN] Could not archive %s: %s", url, e)
+
+class FeedIngest:
+    """Fetch all feed sources concurrently and merge their items into one stream.
+
+    Each source gets a worker thread that fetches over the shared session
+    (with its own timeout) and parses incrementally, pushing FeedItems onto
+    a bounded queue in arrival order. Wall time is that of the slowest
+    source rather than the sum. Per-source outcomes end up in `results`.
+    """
+    _DONE = object()
+
+    def __init__(self, sources, feed_cache, stream=False, max_queued=256):
+        self.sources = list(sources)
+        self.feed_cache = feed_cache
+        self.stream = stream
+        self.results = {}  # url -> {'changed', 'count', 'error', 'cache_entry', 'fetch_seconds', 'parse_seconds'}
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._stopped = set()
+        self._closed = threading.Event()
+        self._pending = len(self.sources)
+        self._peeked = []
+
+    def start(self):
+        for source in self.sources:
+            threading.Thread(target=self._fetch_source, args=(source,), daemon=True).start()
+        return self
+
+    def _fetch_source(self, source):
+        url = source['url']
+        result = {'changed': False, 'count': 0, 'error': None, 'cache_entry': self.feed_cache.get(url, {}),
+                  'fetch_seconds': 0.0, 'parse_seconds': 0.0}
+        try:
+            started = time.perf_counter()
+            chunks, result['cache_entry'] = fetch_feed(
+                url, result['cache_entry'], stream=self.stream, timeout=source.get('timeout', FEED_TIMEOUT_SECONDS))
+            result['fetch_seconds'] = time.perf_counter() - started
+            if chunks is not None:
+                result['changed'] = True
+                if FEED_ARCHIVE_DIR and not self.stream:
+                    archive_feed_body(url, chunks)
+                items = FeedItemStream(chunks, source=url)
+                started, waited = time.perf_counter(), 0.0
+                for item in items:
+                    put_started = time.perf_counter()
+                    if url in self._stopped or not self._put(item):
+                        break
+                    waited += time.perf_counter() - put_started
+                # Time blocked on a full queue belongs to the consumer, not the parser
+                result['parse_seconds'] = time.perf_counter() - started - waited
+                result['count'] = items.count
+                result['error'] = items.error
+        except Exception as e:
+            log.error("[ERROR] Feed fetch failed for %s: %s", url, e)
+            result['error'] = e
+        finally:
+            self.results[url] = result
+            self._put(self._DONE)
+
+    def _put(self, entry):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
         return False
 
-def send_fcm_notification(title, body, data, priority="high", channel_id="f1_major", image_url=None):
-    """Send FCM notification (or log if dry-run)"""
-    if DRY_RUN:
-        print(f"[DRY RUN] Would send notification:")
-        print(f"  Title: {title}")
-        print(f"  Body: {body}")
-        print(f"  Data: {data}")
-        print(f"  Channel: {channel_id}")
+    def _next(self):
+        """Next item from any source, or None once every source is done"""
+        if self._peeked:
+            return self._peeked.pop()
+        while self._pending:
+            entry = self._queue.get()
+            if entry is self._DONE:
+                self._pending -= 1
+            elif entry.source not in self._stopped:
+                return entry
+        return None
+
+    def has_items(self):
+        """Block until the first item arrives; False if no source produced any"""
+        if not self._peeked:
+            item = self._next()
+            if item is None:
+                return False
+            self._peeked.append(item)
         return True
-    
-    print(f"[INFO] Sending FCM Notification: {title}")
-    
-    # Add to data payload
-    if data is None:
-        data = {}
+
+    def __iter__(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            yield item
+
+    def stop(self, url):
+        """Drop the rest of a source (its remaining items were already processed)"""
+        self._stopped.add(url)
+
+    def close(self):
+        self._closed.set()
+
+class FeedCursor:
+    """Per-source high-water mark: newest pubDate processed plus the guids at it.
+
+    Feeds list newest items first, so once an item falls more than the
+    lookback behind the mark everything after it was handled by an earlier
+    run and iteration can stop.
+    """
+
+    def __init__(self, entry=None, lookback_hours=FEED_LOOKBACK_HOURS):
+        entry = entry or {}
+        self.pub_date = datetime.datetime.fromisoformat(entry['pub_date']) if entry.get('pub_date') else None
+        self.guids = set(entry.get('guids', []))
+        self.lookback = datetime.timedelta(hours=lookback_hours)
+        self._next_pub_date = self.pub_date
+        self._next_guids = set(self.guids)
+
+    def is_exhausted(self, pub_date):
+        """True once items are older than the mark minus the lookback"""
+        return self.pub_date is not None and pub_date < self.pub_date - self.lookback
+
+    def is_boundary_item(self, pub_date, guid):
+        """True for an item sitting exactly on the mark that was already processed"""
+        return pub_date == self.pub_date and guid in self.guids
+
+    def advance(self, pub_date, guid):
+        """Record a processed item; the mark moves at the end of the run"""
+        if self._next_pub_date is None or pub_date > self._next_pub_date:
+            self._next_pub_date = pub_date
+            self._next_guids = {guid}
+        elif pub_date == self._next_pub_date:
+            self._next_guids.add(guid)
+
+    def to_dict(self):
+        if self._next_pub_date is None:
+            return {}
+        return {'pub_date': self._next_pub_date.isoformat(), 'guids': sorted(self._next_guids)}
+
+# ============================================================================
+# FIREBASE & NOTIFICATIONS
+# ============================================================================
+
+def init_firebase():
+    """Initialize the Firebase app so bad credentials fail the run up front (not needed for dry runs)"""
+    try:
+        firebase_bootstrap.get_app()
+    except firebase_bootstrap.MissingCredentialsError:
+        log.error("[ERROR] FIREBASE_CREDENTIALS env var not found.")
+        return False
+    except Exception as e:
+        log.error("[ERROR] Error initializing Firebase: %s", e)
+        return False
+    log.info("[INFO] Firebase initialized.")
+    return True
+
+def build_fcm_message(messaging, title, body, data, priority="high", channel_id="f1_major", image_url=None):
+    """Topic data message; the app reads title/body/channel from the data payload"""
+    data = dict(data or {})
     data["title"] = title
     data["body"] = body
     data["channel_id"] = channel_id
@@ -680,72 +1874,265 @@ def send_fcm_notification(title, body, data, priority="high", channel_id="f1_maj
     if image_url and image_url.startswith('https://'):
         data["image_url"] = image_url
     
-    try:
-        android_config = messaging.AndroidConfig(priority=priority)
-        fcm_options = messaging.FCMOptions(analytics_label="f1_news_auto")
-        message = messaging.Message(
-            data=data,
-            topic=FCM_TOPIC,
-            android=android_config,
-            fcm_options=fcm_options
-        )
-        response = messaging.send(message)
-        print(f"  [SUCCESS] Message sent: {response}")
-        return True
-    except Exception as e:
-        print(f"  [ERROR] Error sending message: {e}")
-        return False
+    android_config = messaging.AndroidConfig(priority=priority)
+    fcm_options = messaging.FCMOptions(analytics_label="f1_news_auto")
+    return messaging.Message(
+        data=data,
+        topic=FCM_TOPIC,
+        android=android_config,
+        fcm_options=fcm_options
+    )
+
+class FcmBatch:
+    """Collects notifications and delivers them with one messaging.send_each call.
+
+    add() queues a notification under a caller-chosen tag; flush() sends
+    everything queued (up to FCM_BATCH_SIZE messages per request) and
+    returns (tag, success) pairs in the order they were added, so the
+    caller can apply per-message results to the state. A sink (callable
+    taking the add() fields as a dict and returning success) replaces FCM
+    delivery altogether, e.g. for replays.
+    """
+
+    def __init__(self, dry_run=None, sink=None):
+        self.dry_run = DRY_RUN if dry_run is None else dry_run
+        self.sink = sink
+        self._pending = []  # (tag, kwargs for build_fcm_message)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, tag, title, body, data, priority="high", channel_id="f1_major", image_url=None):
+        self._pending.append((tag, {
+            'title': title, 'body': body, 'data': data,
+            'priority': priority, 'channel_id': channel_id, 'image_url': image_url,
+        }))
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        
+        if self.sink is not None:
+            return [(tag, self.sink(fields)) for tag, fields in pending]
+        
+        if self.dry_run:
+            for _, fields in pending:
+                log.info("[DRY RUN] Would send notification:")
+                log.info("  Title: %s", fields['title'])
+                log.info("  Body: %s", fields['body'])
+                log.info("  Data: %s", fields['data'])
+                log.info("  Channel: %s", fields['channel_id'])
+            return [(tag, True) for tag, _ in pending]
+        
+        log.info("[INFO] Sending %s FCM notification(s)", len(pending))
+        results = []
+        for start in range(0, len(pending), FCM_BATCH_SIZE):
+            chunk = pending[start:start + FCM_BATCH_SIZE]
+            try:
+                messaging = firebase_bootstrap.messaging()
+                messages = [build_fcm_message(messaging, **fields) for _, fields in chunk]
+                batch_response = messaging.send_each(messages)
+                outcomes = batch_response.responses
+            except Exception as e:
+                log.error("  [ERROR] Error sending batch: %s", e)
+                outcomes = [None] * len(chunk)
+            
+            for (tag, fields), outcome in zip(chunk, outcomes):
+                label = fields['body'].splitlines()[0]
+                if outcome is not None and outcome.success:
+                    log.info("  [SUCCESS] Message sent: %s (%s)", label, outcome.message_id)
+                    results.append((tag, True))
+                else:
+                    error = outcome.exception if outcome is not None else "batch request failed"
+                    log.error("  [ERROR] Error sending message '%s': %s", label, error)
+                    results.append((tag, False))
+        return results
+
+def send_fcm_notification(title, body, data, priority="high", channel_id="f1_major", image_url=None):
+    """Send a single FCM notification (or log if dry-run)"""
+    batch = FcmBatch()
+    batch.add(None, title, body, data, priority, channel_id, image_url)
+    return batch.flush()[0][1]
+
+# ============================================================================
+# OUTBOX (durable delivery with retries)
+# ============================================================================
+
+def outbox_entries(state):
+    """The state's outbox (created on first use)"""
+    entries = state.get('outbox')
+    if entries is None:
+        entries = state['outbox'] = []
+    return entries
+
+def enqueue_notification(state, kind, item, title, body, data, priority="high", channel_id="f1_major",
+                         image_url=None, now=None, slot=None, items=None):
+    """Record an intended send; kind is 'nuclear', 'major' or 'digest'.
+
+    `slot` is the major slot the send used up and `items` the digest queue it
+    emptied, so both can be given back if the entry is never delivered.
+    """
+    now = now or datetime.datetime.utcnow()
+    now_epoch = to_epoch(now)
+    if kind == 'digest':
+        expires = to_epoch(window_close('digest', now))
+    else:
+        expires = now_epoch + OUTBOX_MAX_AGE_SECONDS
+    entry_id = f"{kind}:{item['id'] if item else now_epoch}"
+    outbox_entries(state).append({
+        'id': entry_id,
+        'kind': kind,
+        'item': item,
+        'slot': slot,
+        'items': items,
+        'message': {
+            'title': title, 'body': body, 'data': data,
+            'priority': priority, 'channel_id': channel_id, 'image_url': image_url,
+        },
+        'attempts': 0,
+        'created': now_epoch,
+        'next_retry': now_epoch,
+        'expires': expires,
+    })
+
+def outbox_item_ids(state):
+    """Headline ids waiting in the outbox (treated as already sent)"""
+    return set(entry['item']['id'] for entry in outbox_entries(state) if entry.get('item'))
+
+def outbox_expiry(entry):
+    """Epoch after which an entry is no longer worth sending"""
+    return entry.get('expires', entry['created'] + OUTBOX_MAX_AGE_SECONDS)
+
+def release_outbox_entry(state, entry):
+    """Give back what an undelivered entry took: its headlines return to the digest pool,
+    and a same-day slot or digest can be used again"""
+    same_day = datetime.datetime.utcfromtimestamp(entry['created']).strftime('%Y-%m-%d') == state['date']
+    if entry['kind'] == 'digest':
+        items = entry.get('items') or []
+        if same_day:
+            state['digest_sent'] = False
+    else:
+        items = [entry['item']] if entry.get('item') else []
+        if entry.get('slot') and same_day:
+            state[f"{entry['slot']}_remaining"] += 1
+    queued = set(item['id'] for item in state['digest_items'])
+    state['digest_items'].extend(item for item in items if item['id'] not in queued)
+
+def outbox_retry_delay(attempts):
+    """Exponential backoff after `attempts` failed sends"""
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+
+def drain_outbox(state, fingerprint_index=None, now=None, sink=None):
+    """Send every outbox entry that is due in one batch and apply the outcomes.
+
+    Delivered entries are moved to nuclear_sent/major_sent; failed ones are
+    rescheduled with exponential backoff. Entries that expire or run out of
+    attempts are released (see release_outbox_entry) rather than lost, and a
+    nuclear retry that falls in quiet hours goes back to the nuclear queue.
+    Returns (delivered, failed) counts.
+    """
+    now = now or datetime.datetime.utcnow()
+    now_epoch = to_epoch(now)
+    entries = outbox_entries(state)
+    expired = [entry for entry in entries if outbox_expiry(entry) <= now_epoch]
+    for entry in expired:
+        log.warning("  [WARN] Releasing %s: expired after %s attempt(s)", entry['id'], entry['attempts'])
+        release_outbox_entry(state, entry)
+    held = []
+    if is_in_nuclear_quiet_hours(now):
+        held = [entry for entry in entries if entry['kind'] == 'nuclear' and entry not in expired]
+        for entry in held:
+            log.info("  [INFO] Holding %s until quiet hours end", entry['id'])
+            state['nuclear_queue'].append(entry['item'])
+    if expired or held:
+        removed = set(entry['id'] for entry in expired + held)
+        entries = state['outbox'] = [entry for entry in entries if entry['id'] not in removed]
+    ready = [entry for entry in entries if entry['next_retry'] <= now_epoch]
+    if not ready:
+        return 0, 0
+    
+    deliveries = FcmBatch(sink=sink)
+    for entry in ready:
+        deliveries.add(entry, **entry['message'])
+    
+    delivered, failed, dropped = [], 0, []
+    for entry, sent in deliveries.flush():
+        if sent:
+            delivered.append(entry)
+            item = entry.get('item')
+            if entry['kind'] in ('nuclear', 'major') and item:
+                record_sent(state, entry['kind'], item)
+                record_fingerprint(state, fingerprint_index, item)
+            continue
+        
+        failed += 1
+        entry['attempts'] += 1
+        if entry['attempts'] >= OUTBOX_MAX_ATTEMPTS:
+            log.error("  [ERROR] Giving up on %s after %s attempts", entry['id'], entry['attempts'])
+            release_outbox_entry(state, entry)
+            dropped.append(entry)
+        else:
+            entry['next_retry'] = now_epoch + outbox_retry_delay(entry['attempts'])
+            log.warning("  [WARN] Send failed, retry %s of %s in %ss", entry['attempts'], entry['id'], outbox_retry_delay(entry['attempts']))
+    
+    finished = set(entry['id'] for entry in delivered + dropped)
+    state['outbox'] = [entry for entry in entries if entry['id'] not in finished]
+    log.info("[INFO] Outbox: %s delivered, %s failed, %s pending", len(delivered), failed, len(state['outbox']))
+    return len(delivered), failed
 
 # ============================================================================
 # TIME WINDOW HELPERS
 # ============================================================================
 
+def _window_minutes(name):
+    (start_hour, start_min), (end_hour, end_min) = TIME_WINDOWS[name]
+    return start_hour * 60 + start_min, end_hour * 60 + end_min
+
+def in_window(name, current_time):
+    """Whether current_time (UTC) falls inside the named window"""
+    start, end = _window_minutes(name)
+    minute = current_time.hour * 60 + current_time.minute
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+def window_close(name, current_time):
+    """Next time after current_time that the named window closes"""
+    midnight = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    when = midnight + datetime.timedelta(minutes=_window_minutes(name)[1])
+    if when <= current_time:
+        when += datetime.timedelta(days=1)
+    return when
+
+def next_transition(current_time, names=None):
+    """(when, name, opens) for the next time after current_time that a window opens or closes"""
+    midnight = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    best = None
+    for name in names or TIME_WINDOWS:
+        for minutes, opens in zip(_window_minutes(name), (True, False)):
+            when = midnight + datetime.timedelta(minutes=minutes)
+            if when <= current_time:
+                when += datetime.timedelta(days=1)
+            if best is None or when < best[0]:
+                best = (when, name, opens)
+    return best
+
 def is_in_nuclear_quiet_hours(current_time):
     """Check if in nuclear quiet hours (7:30PM - 2:30AM IST = 19:30-02:30 UTC)"""
-    hour, minute = current_time.hour, current_time.minute
-    
-    # 19:30 UTC to 23:59 UTC
-    if hour > 19 or (hour == 19 and minute >= 30):
-        return True
-    
-    # 00:00 UTC to 02:30 UTC
-    if hour < 2 or (hour == 2 and minute < 30):
-        return True
-    
-    return False
+    return in_window('nuclear_quiet_hours', current_time)
 
 def is_in_slot1_window(current_time):
     """Check if in Slot 1 window"""
-    hour, minute = current_time.hour, current_time.minute
-    if hour == SLOT1_START_HOUR and minute >= SLOT1_START_MIN:
-        return True
-    elif SLOT1_START_HOUR < hour < SLOT1_END_HOUR:
-        return True
-    elif hour == SLOT1_END_HOUR and minute < SLOT1_END_MIN:
-        return True
-    return False
+    return in_window('slot1', current_time)
 
 def is_in_slot2_window(current_time):
     """Check if in Slot 2 window"""
-    hour, minute = current_time.hour, current_time.minute
-    if hour == SLOT2_START_HOUR and minute >= SLOT2_START_MIN:
-        return True
-    elif SLOT2_START_HOUR < hour < SLOT2_END_HOUR:
-        return True
-    elif hour == SLOT2_END_HOUR and minute < SLOT2_END_MIN:
-        return True
-    return False
+    return in_window('slot2', current_time)
 
 def is_in_digest_window(current_time):
     """Check if in Digest window"""
-    hour, minute = current_time.hour, current_time.minute
-    if hour == DIGEST_START_HOUR and minute >= DIGEST_START_MIN:
-        return True
-    elif DIGEST_START_HOUR < hour < DIGEST_END_HOUR:
-        return True
-    elif hour == DIGEST_END_HOUR and minute < DIGEST_END_MIN:
-        return True
-    return False
+    return in_window('digest', current_time)
 
 def generate_digest_title(count, day_of_week):
     """Generate context-aware digest title"""
@@ -780,413 +2167,804 @@ def get_emoji_for_item(item):
     return "📰"
 
 # ============================================================================
-# MAIN LOGIC
+# LOGGING, RUN TRACE & METRICS
 # ============================================================================
 
-def main():
-    print(f"[INFO] Starting run at {datetime.datetime.utcnow()}")
-    if DRY_RUN:
-        print("[INFO] *** DRY RUN MODE *** No notifications will be sent")
-    
-    # 1. Load state
-    state = load_state()
-    current_date_str = datetime.datetime.utcnow().strftime('%Y-%m-%d')
-    print(f"[INFO] State schema v{state.get('schema_version', 1)}")
-    print(f"[INFO] Date: {state['date']}, Slot1: {state['slot1_remaining']}, Slot2: {state['slot2_remaining']}")
-    
-    # 2. Reset daily limits if new day
-    if state['date'] != current_date_str:
-        print(f"[INFO] New day detected ({current_date_str}). Resetting daily limits.")
-        state['date'] = current_date_str
-        state['slot1_remaining'] = 1
-        state['slot2_remaining'] = 2
-        state['digest_sent'] = False
-        # DO NOT clear nuclear_sent or major_sent (30-day retention)
-    
-    # 3. Initialize Firebase
-    if not DRY_RUN and not init_firebase():
-        print("[CRITICAL] Firebase init failed. Exiting.")
-        return
-    
-    # 4. Fetch RSS
-    print(f"[INFO] Fetching RSS from {RSS_URL}...")
-    try:
-        response = requests.get(RSS_URL, timeout=10)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-    except Exception as e:
-        print(f"[ERROR] RSS fetch failed: {e}")
-        return
-    
-    # 5. Process items
-    channel = root.find('channel')
-    items = channel.findall('item')
-    print(f"[INFO] Found {len(items)} items in RSS feed")
-    
-    current_time = datetime.datetime.utcnow()
-    
-    nuclear_candidates = []
-    major_candidates = []
-    digest_candidates = []
-    ignored_candidates = []
-    
-    # Build lookup sets
-    sent_nuclear_ids = set(x['id'] for x in state['nuclear_sent'])
-    sent_major_ids = set(x['id'] for x in state['major_sent'])
-    sent_urls = set(state.get('sent_urls', []))
-    ignored_ids = set(state.get('ignored_items', []))
-    queued_nuclear_ids = set(x['id'] for x in state['nuclear_queue'])
-    
+def configure_logging(level=None):
+    """Plain message lines on stdout at LOG_LEVEL (or `level`)"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.handlers[:] = [handler]
+    log.setLevel(level or LOG_LEVEL)
+    log.propagate = False
+
+class RunTrace:
+    """Optional JSONL trace with one compact record per feed item.
+
+    Each record carries the run start, headline id, source, decision and,
+    for scored items, the matched rule ids, base score, decay and final
+    score. Without a path nothing is written, so callers only build
+    details when the trace is enabled (bool(trace)); the per-decision
+    counts in `decisions` are kept either way for the run metrics. The file
+    is appended to, so daemon cycles accumulate in one trace.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or None  # '' disables a trace set in the environment
+        self.run = None
+        self.decisions = {}
+        self._file = None
+
+    def __bool__(self):
+        return self.path is not None
+
+    def start(self, run_started):
+        self.run = run_started.isoformat(timespec='seconds')
+        self.decisions = {}
+
+    def record(self, decision, item_id=None, source=None, details=None, **fields):
+        self.decisions[decision] = self.decisions.get(decision, 0) + 1
+        if self.path is None:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        entry = {'run': self.run, 'id': item_id, 'source': source, 'decision': decision}
+        if details:
+            entry.update(details)
+        entry.update(fields)
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class RunMetrics:
+    """Wall time and counters per stage of a run, exported next to the state.
+
+    Stage times are exclusive: while a nested stage runs the enclosing one
+    is paused, so a section read lazily during dedup counts as state_load
+    only. staged() wraps each pipeline stage, so a stage is charged for
+    its own work and the stages it pulls from for theirs. Feed fetch/parse
+    run on worker threads and are reported per source (fetch is the
+    slowest source, since they overlap; parse is the sum).
+
+    write() produces JSON, or the Prometheus text format when the path
+    ends in .prom (for node_exporter's textfile collector).
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.seconds = {}
+        self.counts = {}
+        self.sources = {}
+        self.state_records = {}
+        self.state_bytes = None
+        self._started_perf = time.perf_counter()
+        self._stack = []  # [stage, resumed_at] per open stage
+
+    def _enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.add_time(parent[0], now - parent[1])
+        self._stack.append([name, now])
+
+    def _exit(self):
+        now = time.perf_counter()
+        name, resumed = self._stack.pop()
+        self.add_time(name, now - resumed)
+        if self._stack:
+            self._stack[-1][1] = now
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def staged(self, iterable, name):
+        """Iterate, charging the time spent producing each item to stage `name`"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_time(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def record_sources(self, results):
+        """Per-source fetch/parse times and item counts from FeedIngest.results"""
+        for url, result in results.items():
+            self.sources[url] = {
+                'fetch_seconds': round(result['fetch_seconds'], 4),
+                'parse_seconds': round(result['parse_seconds'], 4),
+                'items': result['count'],
+                'changed': result['changed'],
+                'error': result['error'] is not None,
+            }
+            self.count('items_read', result['count'])
+        if results:
+            self.add_time('fetch', max(result['fetch_seconds'] for result in results.values()))
+            self.add_time('parse', sum(result['parse_seconds'] for result in results.values()))
+
+    def record_state(self, state):
+        """Record counts for the sections this run loaded (others are not read for this)"""
+        for section in STATE_SECTIONS:
+            value = dict.get(state, section)
+            if value is not None:
+                self.state_records[section] = len(value)
+        store = getattr(state, 'store', None)
+        if store is not None and os.path.isdir(store.directory):
+            self.state_bytes = sum(
+                entry.stat().st_size for entry in os.scandir(store.directory)
+                if entry.is_file() and entry.name.endswith(('.json', '.jsonl', '.bin')) and entry.name != 'metrics.json')
+
+    def to_dict(self):
+        return {
+            'timestamp': int(self.started),
+            'total_seconds': round(time.perf_counter() - self._started_perf, 4),
+            'stage_seconds': {name: round(value, 4) for name, value in sorted(self.seconds.items())},
+            'counts': dict(sorted(self.counts.items())),
+            'state_records': dict(sorted(self.state_records.items())),
+            'state_bytes': self.state_bytes,
+            'sources': self.sources,
+        }
+
+    def to_prometheus(self):
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP f1_notifications_{name} {help_text}")
+            lines.append(f"# TYPE f1_notifications_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"f1_notifications_{name}{{{label_text}}} {value}" if label_text
+                             else f"f1_notifications_{name} {value}")
+
+        metric('last_run_timestamp_seconds', 'gauge', 'Start of the last run', [((), data['timestamp'])])
+        metric('run_seconds', 'gauge', 'Wall time of the last run', [((), data['total_seconds'])])
+        metric('stage_seconds', 'gauge', 'Wall time per stage of the last run',
+               [((('stage', name),), value) for name, value in data['stage_seconds'].items()])
+        metric('run_count', 'gauge', 'Counters for the last run',
+               [((('counter', name),), value) for name, value in data['counts'].items()])
+        metric('state_records', 'gauge', 'Records per loaded state section',
+               [((('section', name),), value) for name, value in data['state_records'].items()])
+        if data['state_bytes'] is not None:
+            metric('state_bytes', 'gauge', 'Size of the state files on disk', [((), data['state_bytes'])])
+        for field in ('fetch_seconds', 'parse_seconds', 'items'):
+            metric(f'feed_{field}', 'gauge', f'Per-source feed {field.replace("_", " ")}',
+                   [((('source', url),), stats[field]) for url, stats in data['sources'].items()])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics atomically (scrapers never see a partial file)"""
+        if not path:
+            return
+        content = self.to_prometheus() if path.endswith('.prom') else json.dumps(self.to_dict(), indent=2) + "\n"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+# ============================================================================
+# PIPELINE STAGES
+# ============================================================================
+#
+# A run is a chain of generators over Headline records:
+#   fetch (FeedIngest) -> parse_items -> dedup_items -> score_items
+#   -> validate_items -> route
+# followed by the delivery steps (deliver_nuclear, send_majors,
+# rebuild_digest_queue, send_digest) and expire_state. Items stream through
+# the chain one at a time; each stage works on any iterable of the records
+# its predecessor yields, so a new source only has to produce FeedItems.
+
+class Headline:
+    """A feed item on its way through the pipeline"""
+
+    __slots__ = ('item', 'pub_date', 'id', 'score', 'category', 'details')
+
+    def __init__(self, item, pub_date, headline_id):
+        self.item = item
+        self.pub_date = pub_date
+        self.id = headline_id
+        self.score = None
+        self.category = None
+        self.details = None  # Trace details (only built when the trace is enabled)
+
+    @property
+    def title(self):
+        return self.item.title
+
+    @property
+    def url(self):
+        return self.item.link
+
+    @property
+    def summary(self):
+        return self.item.summary
+
+    @property
+    def source(self):
+        return self.item.source
+
+    def to_record(self):
+        """The dict kept in the state queues and sent lists"""
+        return {
+            "id": self.id,
+            "title": self.item.title,
+            "url": self.item.link,
+            "score": self.score,
+            "timestamp": self.pub_date.isoformat(),
+            "ts": to_epoch(self.pub_date),
+            "image": self.item.image_url
+        }
+
+def parse_items(items, cursors, trace=None, stop=None):
+    """Headlines for FeedItems that are new since each source's high-water mark.
+
+    cursors maps a source to its FeedCursor, which is advanced as items
+    pass; stop(source) is called once a source reaches items it already saw.
+    """
+    if trace is None:
+        trace = RunTrace()
     for item in items:
-        title = item.find('title').text
-        link = item.find('link').text
-        pub_date_str = item.find('pubDate').text
-        summary_node = item.find('description')
-        summary = summary_node.text if summary_node is not None else ""
-        
-        # Extract image
-        image_url = None
-        enclosure = item.find('enclosure')
-        if enclosure is not None:
-            image_url = enclosure.get('url')
-        
-        print(f"\n[ITEM] {title}")
-        
-        # Parse date
+        log.debug("\n[ITEM] %s", item.title)
         try:
-            pub_date = datetime.datetime.strptime(pub_date_str, "%a, %d %b %Y %H:%M:%S %z").replace(tzinfo=None)
+            pub_date = parse_pub_date(item.pub_date_str)
         except Exception as e:
-            print(f"  [SKIP] Date parse failed: {e}")
-            continue
-        
-        headline_id = generate_id(title, pub_date_str)
-        
-        # === DEDUPLICATION LAYER ===
-        
-        # Check 1: ID in sent lists
-        if headline_id in sent_nuclear_ids:
-            print("  [SKIP] Already sent (Nuclear)")
-            continue
-        if headline_id in sent_major_ids:
-            print("  [SKIP] Already sent (Major)")
-            continue
-        if headline_id in queued_nuclear_ids:
-            print("  [SKIP] Already queued (Nuclear)")
-            continue
-        if headline_id in ignored_ids:
-            print("  [SKIP] Already ignored")
+            log.debug("  [SKIP] Date parse failed: %s", e)
+            trace.record("skip_date", source=item.source, guid=item.guid)
             continue
         
-        # Check 2: URL dedup
-        if link in sent_urls:
-            print(f"  [SKIP] URL already sent (title may have changed)")
-            ignored_candidates.append(headline_id)
+        cursor = cursors[item.source]
+        if cursor.is_exhausted(pub_date):
+            log.debug("  [STOP] Older than high-water mark %s minus %sh lookback; done with %s", cursor.pub_date, FEED_LOOKBACK_HOURS, item.source)
+            if stop is not None:
+                stop(item.source)
+            trace.record("stop_high_water", source=item.source, guid=item.guid)
             continue
-        
-        # Check 3: Fuzzy title match
-        is_dup, similar_title = is_fuzzy_duplicate(title, state.get('title_fingerprints', []))
-        if is_dup:
-            print(f"  [SKIP] Fuzzy duplicate of: {similar_title}")
-            ignored_candidates.append(headline_id)
+        if cursor.is_boundary_item(pub_date, item.guid):
+            log.debug("  [SKIP] Already processed (high-water mark)")
+            trace.record("skip_high_water", source=item.source, guid=item.guid)
             continue
+        cursor.advance(pub_date, item.guid)
         
-        # Check 4: Universal reject patterns
-        is_reject, reject_pattern = check_universal_reject(title)
-        if is_reject:
-            print(f"  [SKIP] Universal reject: {reject_pattern}")
-            ignored_candidates.append(headline_id)
-            continue
-        
-        # === SCORING ===
-        
-        score, category = score_with_age(title, pub_date)
+        yield Headline(item, pub_date, generate_id(item.title, item.pub_date_str))
 
-        if score >= NUCLEAR_THRESHOLD and category == "nuclear":
-            try:
-                validation = validate_nuclear_event(title, summary)
-                if not validation.get("confirmed", False):
-                    demote_to = validation.get("demote_to") or "major"
-                    category = "major" if demote_to == "major" else "digest"
-                    if category == "major":
-                        score = max(MAJOR_THRESHOLD, min(score, NUCLEAR_THRESHOLD - 1))
-                    else:
-                        score = max(DIGEST_THRESHOLD, min(score, MAJOR_THRESHOLD - 1))
-                    print(f"  [AI DEMOTE] Nuclear candidate demoted to {category}: {validation.get('reason', 'validation failed')}")
+def dedup_items(headlines, known, sent_urls, fingerprint_index, ignored, trace=None):
+    """Headlines not seen before.
+
+    known is a sequence of (ids, decision, reason): a headline whose id is
+    in ids is dropped with that trace decision. Headlines dropped for a
+    sent URL, a fuzzy title match or a reject pattern have their ids
+    appended to `ignored`.
+    """
+    if trace is None:
+        trace = RunTrace()
+    for headline in headlines:
+        # Check 1: ID already sent, queued or ignored
+        for ids, decision, reason in known:
+            if headline.id in ids:
+                log.debug("  [SKIP] %s", reason)
+                trace.record(decision, headline.id, headline.source)
+                break
+        else:
+            # Check 2: URL dedup
+            if headline.url in sent_urls:
+                log.debug("  [SKIP] URL already sent (title may have changed)")
+                decision = "skip_url"
+            else:
+                # Check 3: Fuzzy title match
+                is_dup, similar_title = is_fuzzy_duplicate(headline.title, fingerprint_index)
+                if is_dup:
+                    log.debug("  [SKIP] Fuzzy duplicate of: %s", similar_title)
+                    decision = "skip_fuzzy"
                 else:
-                    print(f"  [AI PASS] Nuclear validation passed: {validation.get('reason', 'confirmed state-change')}" )
-            except Exception as e:
-                print(f"  [AI FALLBACK] Nuclear validation unavailable, keeping regex score: {e}")
-        
-        item_data = {
-            "id": headline_id,
-            "title": title,
-            "url": link,
-            "score": int(score),
-            "timestamp": pub_date.isoformat(),
-            "image": image_url
-        }
-        
-        # Categorize
-        if category == "nuclear":
-            nuclear_candidates.append(item_data)
-        elif category == "major":
-            major_candidates.append(item_data)
-        elif category == "digest":
-            digest_candidates.append(item_data)
-        else:  # ignore or hard_ignore
-            ignored_candidates.append(headline_id)
-    
-    print(f"\n[INFO] Categorization: Nuclear={len(nuclear_candidates)}, Major={len(major_candidates)}, Digest={len(digest_candidates)}, Ignored={len(ignored_candidates)}")
-    
-    # === NUCLEAR PROCESSING ===
+                    # Check 4: Universal reject patterns
+                    is_reject, reject_pattern = check_universal_reject(headline.title)
+                    if not is_reject:
+                        yield headline
+                        continue
+                    log.debug("  [SKIP] Universal reject: %s", reject_pattern)
+                    decision = "skip_reject"
+            ignored.append(headline.id)
+            trace.record(decision, headline.id, headline.source)
+
+def score_items(headlines, now=None, trace=None):
+    """Set score and category on each headline"""
+    for headline in headlines:
+        details = {} if trace else None
+        score, category = score_with_age(headline.title, headline.pub_date, now, details)
+        headline.score = int(score)
+        headline.category = category
+        if details is not None:
+            details['score'] = headline.score
+        headline.details = details
+        yield headline
+
+def validate_items(headlines, validator):
+    """Pass headlines through, holding nuclear candidates for validation.
+
+    Candidates are submitted to `validator` (a NuclearValidator) as they
+    arrive and released with their verdict applied once the input is
+    exhausted; a demoted candidate has its category and score lowered.
+    """
+    for headline in headlines:
+        if headline.category == "nuclear" and headline.score >= NUCLEAR_THRESHOLD:
+            validator.submit(headline, headline.summary)
+            continue
+        yield headline
     
-    in_quiet_hours = is_in_nuclear_quiet_hours(current_time)
-    print(f"\n[INFO] Nuclear quiet hours: {in_quiet_hours}")
+    if not validator:
+        return
+    log.info("\n[INFO] Awaiting validation of %s nuclear candidate(s)...", len(validator))
+    for headline, validation in validator.results():
+        log.debug("[ITEM] %s", headline.title)
+        if validation is None:
+            log.warning("  [AI FALLBACK] Nuclear validation unavailable, keeping regex score")
+        elif not validation.get("confirmed", False):
+            demote_to = headline.category = validation.get("demote_to") or "major"
+            if demote_to == "major":
+                headline.score = int(max(MAJOR_THRESHOLD, min(headline.score, NUCLEAR_THRESHOLD - 1)))
+            else:
+                headline.score = int(max(DIGEST_THRESHOLD, min(headline.score, MAJOR_THRESHOLD - 1)))
+            log.info("  [AI DEMOTE] Nuclear candidate demoted to %s: %s", demote_to, validation.get('reason', 'validation failed'))
+        else:
+            log.info("  [AI PASS] Nuclear validation passed: %s", validation.get('reason', 'confirmed state-change'))
+        if headline.details is not None:
+            headline.details['validated'] = None if validation is None else bool(validation.get("confirmed", False))
+        yield headline
+
+def route(headlines, ignored, trace=None):
+    """Sort scored headlines into {'nuclear': [...], 'major': [...], 'digest': [...]} state records.
+
+    Ids of ignored headlines are appended to `ignored`.
+    """
+    if trace is None:
+        trace = RunTrace()
+    routes = {'nuclear': [], 'major': [], 'digest': []}
+    for headline in headlines:
+        trace.record(headline.category, headline.id, headline.source, headline.details)
+        if headline.category in routes:
+            routes[headline.category].append(headline.to_record())
+        else:  # ignore or hard_ignore
+            ignored.append(headline.id)
+    return routes
+
+def commit_feed_progress(results, feed_cache, feed_cursors, cursors):
+    """Store cache entries and high-water marks for the sources read without errors"""
+    for url, result in results.items():
+        if not result['changed']:
+            feed_cache[url] = result['cache_entry']
+            continue
+        log.info("[INFO] Read %s items from %s", result['count'], url)
+        if result['error'] is None:
+            feed_cache[url] = result['cache_entry']
+            feed_cursors[url] = cursors[url].to_dict()
+        # On errors the cache entry and cursor stay put so the next run sees the whole feed again
+
+def enqueue_nuclear(state, item, now=None):
+    enqueue_notification(
+        state, 'nuclear', item,
+        title="F1 News",
+        body=f"🚨 {item['title']}",
+        data={"type": "nuclear", "url": item['url'], "score": str(item['score']), "channel_id": "f1_nuclear"},
+        priority="high",
+        channel_id="f1_nuclear",
+        image_url=item.get('image'),
+        now=now
+    )
+
+def deliver_nuclear(state, candidates, now):
+    """Queue nuclear items during quiet hours, otherwise send them (and anything queued earlier)"""
+    in_quiet_hours = is_in_nuclear_quiet_hours(now)
+    log.info("\n[INFO] Nuclear quiet hours: %s", in_quiet_hours)
     
     # Send queued nuclear items (if outside quiet hours)
     if not in_quiet_hours and state['nuclear_queue']:
-        print(f"\n[INFO] Processing {len(state['nuclear_queue'])} queued nuclear items...")
-        sent_nuclear_ids_set = set(x['id'] for x in state['nuclear_sent'])
-        queue_copy = list(state['nuclear_queue'])
-        successfully_sent = []
+        log.info("\n[INFO] Processing %s queued nuclear items...", len(state['nuclear_queue']))
+        sent_ids = set(x['id'] for x in state['nuclear_sent']) | outbox_item_ids(state)
         
-        for item in queue_copy:
+        for item in state['nuclear_queue']:
             # Double-check not already sent
-            if item['id'] in sent_nuclear_ids_set:
-                print(f"\n[NUCLEAR QUEUED] SKIP (already sent): {item['title']}")
-                successfully_sent.append(item)
+            if item['id'] in sent_ids:
+                log.info("\n[NUCLEAR QUEUED] SKIP (already sent): %s", item['title'])
                 continue
-            
-            print(f"\n[NUCLEAR QUEUED] Sending: {item['title']}")
-            if send_fcm_notification(
-                title="F1 News",
-                body=f"🚨 {item['title']}",
-                data={"type": "nuclear", "url": item['url'], "score": str(item['score']), "channel_id": "f1_nuclear"},
-                priority="high",
-                channel_id="f1_nuclear",
-                image_url=item.get('image')
-            ):
-                state['nuclear_sent'].append(item)
-                state['sent_urls'].append(item['url'])
-                state['title_fingerprints'].append(create_title_fingerprint(item['title'], item['timestamp']))
-                successfully_sent.append(item)
-                sent_nuclear_ids_set.add(item['id'])
-            else:
-                print(f"  [WARN] Send failed, keeping in queue")
+            log.info("\n[NUCLEAR QUEUED] Sending: %s", item['title'])
+            enqueue_nuclear(state, item, now)
+            sent_ids.add(item['id'])
         
-        state['nuclear_queue'] = [item for item in state['nuclear_queue'] if item not in successfully_sent]
-        print(f"[INFO] Queue processed. Remaining: {len(state['nuclear_queue'])}")
+        # Delivery (and any retries) is now the outbox's job
+        state['nuclear_queue'] = []
     
-    # Process new nuclear items
-    for item in nuclear_candidates:
+    for item in candidates:
         if in_quiet_hours:
-            print(f"\n[NUCLEAR] Queuing (quiet hours): {item['title']}")
+            log.info("\n[NUCLEAR] Queuing (quiet hours): %s", item['title'])
             state['nuclear_queue'].append(item)
         else:
-            print(f"\n[NUCLEAR] Sending: {item['title']}")
-            if send_fcm_notification(
-                title="F1 News",
-                body=f"🚨 {item['title']}",
-                data={"type": "nuclear", "url": item['url'], "score": str(item['score']), "channel_id": "f1_nuclear"},
-                priority="high",
-                channel_id="f1_nuclear",
-                image_url=item.get('image')
-            ):
-                state['nuclear_sent'].append(item)
-                state['sent_urls'].append(item['url'])
-                state['title_fingerprints'].append(create_title_fingerprint(item['title'], item['timestamp']))
-    
-    # === MAJOR PROCESSING ===
-    
-    # Build major pool (queue + new)
-    major_from_queue = [item for item in state['digest_items'] if item.get('score', 0) >= MAJOR_THRESHOLD]
-    all_major_candidates = major_from_queue + major_candidates
-    
-    # Dedup
-    unique_major = {}
-    for item in all_major_candidates:
-        unique_major[item['id']] = item
-    all_major_candidates = list(unique_major.values())
-    
-    # Filter already sent
-    all_sent_ids = sent_nuclear_ids | sent_major_ids | queued_nuclear_ids
-    all_major_candidates = [item for item in all_major_candidates if item['id'] not in all_sent_ids]
-    
-    # Sort by score, then timestamp
-    all_major_candidates.sort(key=lambda x: (x['score'], x['timestamp']), reverse=True)
-    
-    print(f"\n[INFO] Major candidates: {len(all_major_candidates)}")
-    
-    # Send based on slots
-    in_slot1 = is_in_slot1_window(current_time)
-    in_slot2 = is_in_slot2_window(current_time)
-    
-    print(f"[INFO] Time windows: Slot1={in_slot1}, Slot2={in_slot2}")
-    print(f"[INFO] Available slots: Slot1={state['slot1_remaining']}, Slot2={state['slot2_remaining']}")
-    
-    if in_slot1 and state['slot1_remaining'] > 0:
-        to_send = all_major_candidates[:state['slot1_remaining']]
-        for item in to_send:
-            print(f"\n[MAJOR SLOT1] Sending: {item['title']} (score: {item['score']})")
-            if send_fcm_notification(
-                title="F1 News",
-                body=item['title'],
-                data={"type": "major", "url": item['url'], "score": str(item['score']), "channel_id": "f1_major"},
-                priority="high",
-                channel_id="f1_major",
-                image_url=item.get('image')
-            ):
-                state['slot1_remaining'] -= 1
-                state['major_sent'].append(item)
-                state['sent_urls'].append(item['url'])
-                state['title_fingerprints'].append(create_title_fingerprint(item['title'], item['timestamp']))
-                all_major_candidates.remove(item)
-    
-    if in_slot2 and state['slot2_remaining'] > 0:
-        to_send = all_major_candidates[:state['slot2_remaining']]
+            log.info("\n[NUCLEAR] Sending: %s", item['title'])
+            enqueue_nuclear(state, item, now)
+
+def _by_score(item):
+    return (item['score'], item['timestamp'])
+
+def send_majors(state, candidates, excluded_ids, now):
+    """Send the best majors (queued or new) into the open slots; returns the unsent ones, best first"""
+    # One pool keyed by id: a new candidate replaces its queued copy in place
+    pool = {}
+    for item in state['digest_items']:
+        if item.get('score', 0) >= MAJOR_THRESHOLD:
+            pool[item['id']] = item
+    for item in candidates:
+        pool[item['id']] = item
+    pending = [item for item in pool.values() if item['id'] not in excluded_ids]
+    pending.sort(key=_by_score, reverse=True)
+    
+    log.info("\n[INFO] Major candidates: %s", len(pending))
+    
+    in_slot1 = is_in_slot1_window(now)
+    in_slot2 = is_in_slot2_window(now)
+    log.info("[INFO] Time windows: Slot1=%s, Slot2=%s", in_slot1, in_slot2)
+    log.info("[INFO] Available slots: Slot1=%s, Slot2=%s", state['slot1_remaining'], state['slot2_remaining'])
+    
+    # Slots are used up when a message enters the outbox; retries don't need a free slot
+    for slot, in_window in (('slot1', in_slot1), ('slot2', in_slot2)):
+        remaining_key = f"{slot}_remaining"
+        if not in_window or state[remaining_key] <= 0:
+            continue
+        to_send = pending[:state[remaining_key]]
         for item in to_send:
-            print(f"\n[MAJOR SLOT2] Sending: {item['title']} (score: {item['score']})")
-            if send_fcm_notification(
+            log.info("\n[MAJOR %s] Sending: %s (score: %s)", slot.upper(), item['title'], item['score'])
+            enqueue_notification(
+                state, 'major', item,
                 title="F1 News",
                 body=item['title'],
                 data={"type": "major", "url": item['url'], "score": str(item['score']), "channel_id": "f1_major"},
                 priority="high",
                 channel_id="f1_major",
-                image_url=item.get('image')
-            ):
-                state['slot2_remaining'] -= 1
-                state['major_sent'].append(item)
-                state['sent_urls'].append(item['url'])
-                state['title_fingerprints'].append(create_title_fingerprint(item['title'], item['timestamp']))
-                all_major_candidates.remove(item)
-    
-    unsent_majors = all_major_candidates
-    
-    # === DIGEST QUEUE REBUILD ===
-    
-    # Collect all digest candidates
-    all_digest_candidates = []
+                image_url=item.get('image'),
+                now=now,
+                slot=slot
+            )
+            state[remaining_key] -= 1
+        del pending[:len(to_send)]
+    return pending
+
+def rebuild_digest_queue(state, candidates, unsent_majors):
+    """Merge new digest items and unsent majors into the digest queue.
+
+    Sent items drop out; all majors are kept (Protect Majors) along with
+    the top 12 digest items, best first.
+    """
+    sent_ids = set(x['id'] for x in state['nuclear_sent']) | set(x['id'] for x in state['major_sent']) | outbox_item_ids(state)
+    merged = {}
+    for items in (state['digest_items'], candidates, unsent_majors):
+        for item in items:
+            merged[item['id']] = item
+    majors, digests = [], []
+    for item in merged.values():
+        if item['id'] not in sent_ids:
+            (majors if item['score'] >= MAJOR_THRESHOLD else digests).append(item)
+    pending = majors + heapq.nlargest(12, digests, key=_by_score)
+    pending.sort(key=_by_score, reverse=True)
+    state['digest_items'] = pending
+    
+    log.info("\n[INFO] Digest queue: %s items", len(pending))
+    if pending:
+        log.info("[INFO] Top scores: %s", [item['score'] for item in pending])
+
+def send_digest(state, now):
+    """Enqueue the daily digest if its window is open and the queue is strong enough; True if sent"""
+    if not is_in_digest_window(now) or state['digest_sent']:
+        return False
+    log.info("\n[INFO] In digest window...")
     
-    # Existing digest items (exclude those sent as major)
-    sent_major_ids_set = set(x['id'] for x in state['major_sent'])
-    existing_digest = [item for item in state['digest_items'] if item['id'] not in sent_major_ids_set]
-    all_digest_candidates.extend(existing_digest)
+    if len(state['digest_items']) < 3:
+        log.info("[INFO] Not enough items (%s < 3)", len(state['digest_items']))
+        return False
+    top3_sum = sum(item['score'] for item in state['digest_items'][:3])
+    log.info("[INFO] Top 3 sum: %s (threshold: %s)", top3_sum, DIGEST_COMBINED_THRESHOLD)
+    if top3_sum < DIGEST_COMBINED_THRESHOLD:
+        log.info("[INFO] Threshold not met")
+        return False
     
-    # New digest items
-    all_digest_candidates.extend(digest_candidates)
+    day_of_week = now.strftime('%A')
+    is_race_weekend = day_of_week in ['Monday', 'Friday', 'Saturday', 'Sunday']
+    max_items = 6 if is_race_weekend else 4
+    
+    items_to_send = state['digest_items'][:max_items]
+    digest_title = generate_digest_title(len(items_to_send), day_of_week)
+    log.info("[INFO] Sending digest: %s", digest_title)
+    
+    body = "\n".join(f"{get_emoji_for_item(item)} {item['title']}" for item in items_to_send) + "\n\nTap to read more"
+    enqueue_notification(
+        state, 'digest', None,
+        title=digest_title,
+        body=body,
+        data={"type": "digest", "count": str(len(items_to_send)), "channel_id": "f1_digest", "target_tab": "news"},
+        priority="normal",
+        channel_id="f1_digest",
+        now=now,
+        items=list(state['digest_items'])
+    )
     
-    # Unsent majors
-    all_digest_candidates.extend(unsent_majors)
+    # Failed sends are retried from the outbox (and the queue restored if they never
+    # get through), so the digest counts as sent
+    state['digest_sent'] = True
+    state['digest_items'] = []
+    return True
+
+def expire_state(state, now):
+    """Drop sent records, digest items and fingerprints past their retention windows"""
+    # 30-day retention for sent items (their URLs go with them)
+    sent_cutoff = to_epoch(now - datetime.timedelta(days=SENT_RETENTION_DAYS))
+    expire_sent(state, sent_cutoff)
     
-    # Dedup
-    unique_digest = {}
-    for item in all_digest_candidates:
-        unique_digest[item['id']] = item
-    all_digest_candidates = list(unique_digest.values())
+    # 14-day retention for digest (a short queue kept in score order)
+    digest_cutoff = to_epoch(now - datetime.timedelta(days=DIGEST_RETENTION_DAYS))
+    state['digest_items'] = [x for x in state['digest_items'] if record_epoch(x) > digest_cutoff]
     
-    # Filter sent
-    all_sent_ids = set(x['id'] for x in state['nuclear_sent']) | set(x['id'] for x in state['major_sent'])
-    all_digest_candidates = [item for item in all_digest_candidates if item['id'] not in all_sent_ids]
+    # ignored_items is capped by its RingIdSet (oldest ids drop out first)
     
-    # Sort and keep (Protect Majors)
-    pending_majors = [x for x in all_digest_candidates if x['score'] >= MAJOR_THRESHOLD]
-    pending_digests = [x for x in all_digest_candidates if x['score'] < MAJOR_THRESHOLD]
+    # Expire title_fingerprints (same retention window as sent items);
+    # new ones were already added as items were sent. Skipped when this run
+    # never read them; the next run that does will expire them.
+    if 'title_fingerprints' in state:
+        time_ordered(state, 'title_fingerprints').expire(sent_cutoff)
 
-    # Cap only digest items (keep top 12)
-    pending_digests.sort(key=lambda x: (x['score'], x['timestamp']), reverse=True)
-    pending_digests = pending_digests[:12]
+# ============================================================================
+# MAIN LOGIC
+# ============================================================================
+
+def run_cycle(state, trace=None, metrics=None, now=None, ingest=None, sink=None):
+    """One poll: fetch, dedup, score and deliver, updating `state` in place.
 
-    # Recombine and sort
-    state['digest_items'] = pending_majors + pending_digests
-    state['digest_items'].sort(key=lambda x: (x['score'], x['timestamp']), reverse=True)
+    Replays substitute the outside world: `now` fixes the clock for the
+    whole cycle, `ingest(sources, feed_cache)` returns a started
+    FeedIngest-like item source instead of fetching, and `sink` replaces
+    FCM delivery (see FcmBatch).
+    """
+    if trace is None:
+        trace = RunTrace()
+    if metrics is None:
+        metrics = RunMetrics()
+    if isinstance(state, NotificationState):
+        state.metrics = metrics
+    run_started = now or datetime.datetime.utcnow()
+    trace.start(run_started)
+    log.info("[INFO] Starting run at %s", run_started)
+    current_date_str = run_started.strftime('%Y-%m-%d')
+    log.info("[INFO] Date: %s, Slot1: %s, Slot2: %s", state['date'], state['slot1_remaining'], state['slot2_remaining'])
+    
+    fingerprint_index = None
+    
+    def deliver():
+        with metrics.stage('send'):
+            delivered, failed = drain_outbox(state, fingerprint_index, current_time, sink)
+        metrics.count('notifications_delivered', delivered)
+        metrics.count('notifications_failed', failed)
+    
+    # 1. Reset daily limits if new day
+    if state['date'] != current_date_str:
+        log.info("[INFO] New day detected (%s). Resetting daily limits.", current_date_str)
+        state['date'] = current_date_str
+        state['slot1_remaining'] = 1
+        state['slot2_remaining'] = 2
+        state['digest_sent'] = False
+        state['gemini_calls'] = 0
+        # DO NOT clear nuclear_sent or major_sent (30-day retention)
     
-    print(f"\n[INFO] Digest queue: {len(state['digest_items'])} items")
-    if state['digest_items']:
-        print(f"[INFO] Top scores: {[item['score'] for item in state['digest_items']]}")
+    # 2. Retry notifications left in the outbox by earlier runs
+    current_time = run_started
+    if outbox_entries(state):
+        log.info("[INFO] Draining outbox (%s pending)...", len(state['outbox']))
+        deliver()
+    
+    # 3. Fetch feeds concurrently (conditional; unchanged feeds skip straight to the time-window sends)
+    sources = feed_sources()
+    log.info("[INFO] Fetching %s feed(s): %s", len(sources), ', '.join(source['url'] for source in sources))
+    feed_cache = state.setdefault('feed_cache', {})
+    if ingest is None:
+        items = FeedIngest(sources, feed_cache, stream=STREAM_FEED).start()
+    else:
+        items = ingest(sources, feed_cache)
+    
+    with metrics.stage('feed_wait'):
+        feed_changed = items.has_items()
+    if not feed_changed:
+        metrics.record_sources(items.results)
+        if all(result['error'] is not None for result in items.results.values()):
+            log.error("[ERROR] All feed fetches failed")
+            return
+        log.info("[INFO] Feeds unchanged since last run; skipping parse, dedup and scoring")
     
-    # === DIGEST SEND ===
+    current_time = now or datetime.datetime.utcnow()
     
-    if is_in_digest_window(current_time) and not state['digest_sent']:
-        print(f"\n[INFO] In digest window...")
+    # Build lookup sets
+    with metrics.stage('dedup'):
+        sent_nuclear_ids = set(x['id'] for x in state['nuclear_sent'])
+        sent_major_ids = set(x['id'] for x in state['major_sent'])
+        queued_nuclear_ids = set(x['id'] for x in state['nuclear_queue'])
+        known = ()
+        sent_urls = ()
         
-        if len(state['digest_items']) >= 3:
-            top3_sum = sum(item['score'] for item in state['digest_items'][:3])
-            print(f"[INFO] Top 3 sum: {top3_sum} (threshold: {DIGEST_COMBINED_THRESHOLD})")
+        # Item-level dedup state is only read when there are items to check
+        if feed_changed:
+            known = (
+                (sent_nuclear_ids, "skip_sent", "Already sent (Nuclear)"),
+                (sent_major_ids, "skip_sent", "Already sent (Major)"),
+                (queued_nuclear_ids, "skip_queued", "Already queued (Nuclear)"),
+                (outbox_item_ids(state), "skip_outbox", "Awaiting delivery (outbox)"),
+                (state['ignored_items'], "skip_ignored", "Already ignored"),
+            )
+            sent_urls = sent_url_counts(state)
             
-            if top3_sum >= DIGEST_COMBINED_THRESHOLD:
-                day_of_week = current_time.strftime('%A')
-                is_race_weekend = day_of_week in ['Monday', 'Friday', 'Saturday', 'Sunday']
-                max_items = 6 if is_race_weekend else 4
-                
-                items_to_send = state['digest_items'][:max_items]
-                digest_title = generate_digest_title(len(items_to_send), day_of_week)
-                
-                print(f"[INFO] Sending digest: {digest_title}")
-                
-                body_lines = []
-                for item in items_to_send:
-                    emoji = get_emoji_for_item(item)
-                    body_lines.append(f"{emoji} {item['title']}")
-                
-                body = "\n".join(body_lines) + "\n\nTap to read more"
-                
-                send_fcm_notification(
-                    title=digest_title,
-                    body=body,
-                    data={"type": "digest", "count": str(len(items_to_send)), "channel_id": "f1_digest", "target_tab": "news"},
-                    priority="normal",
-                    channel_id="f1_digest"
-                )
-                
-                state['digest_sent'] = True
-                state['digest_items'] = []
-            else:
-                print(f"[INFO] Threshold not met")
-        else:
-            print(f"[INFO] Not enough items ({len(state['digest_items'])} < 3)")
-    
-    # === UPDATE IGNORED ITEMS ===
-    
-    state['ignored_items'].extend(ignored_candidates)
-    
-    # === CLEANUP ===
+            # Fuzzy dedup covers everything sent within the retention window
+            sent_cutoff = current_time - datetime.timedelta(days=SENT_RETENTION_DAYS)
+            fingerprint_index = FingerprintIndex(state.get('title_fingerprints', []), cutoff=to_epoch(sent_cutoff))
+    
+    # 4. Stream items through the stages (merged across sources, parsed incrementally as bodies arrive)
+    feed_cursors = state.setdefault('feed_cursors', {})
+    cursors = {source['url']: FeedCursor(feed_cursors.get(source['url'])) for source in sources}
+    nuclear_validator = NuclearValidator(state, current_time)  # Runs alongside the stream
+    ignored_candidates = []
     
-    print(f"\n[INFO] Cleaning up state...")
+    headlines = metrics.staged(items, 'feed_wait')
+    headlines = metrics.staged(parse_items(headlines, cursors, trace, items.stop), 'dedup')
+    headlines = metrics.staged(dedup_items(headlines, known, sent_urls, fingerprint_index, ignored_candidates, trace), 'dedup')
+    headlines = metrics.staged(score_items(headlines, current_time, trace), 'score')
+    headlines = metrics.staged(validate_items(headlines, nuclear_validator), 'validation')
+    routes = route(headlines, ignored_candidates, trace)
+    
+    items.close()
+    commit_feed_progress(items.results, feed_cache, feed_cursors, cursors)
+    if feed_changed:
+        metrics.record_sources(items.results)
+    if nuclear_validator:
+        metrics.count('nuclear_validated', len(nuclear_validator))
+    for decision, count in trace.decisions.items():
+        metrics.count(f"items_{decision}", count)
+    
+    log.info("\n[INFO] Categorization: Nuclear=%s, Major=%s, Digest=%s, Ignored=%s", len(routes['nuclear']), len(routes['major']), len(routes['digest']), len(ignored_candidates))
+    
+    # 5. Deliver: nuclear and major notifications go out together, then the digest
+    deliver_nuclear(state, routes['nuclear'], current_time)
+    excluded_ids = sent_nuclear_ids | sent_major_ids | queued_nuclear_ids | outbox_item_ids(state)
+    unsent_majors = send_majors(state, routes['major'], excluded_ids, current_time)
+    deliver()
+    
+    rebuild_digest_queue(state, routes['digest'], unsent_majors)
+    if send_digest(state, current_time):
+        deliver()
+    
+    # 6. Persist
+    if ignored_candidates:
+        state['ignored_items'].extend(ignored_candidates)
+    
+    log.info("\n[INFO] Cleaning up state...")
+    with metrics.stage('cleanup'):
+        expire_state(state, current_time)
+    
+    ignored_count = len(state['ignored_items']) if 'ignored_items' in state else 'not loaded'
+    log.info("[INFO] Cleanup: nuclear_sent=%s, major_sent=%s, ignored=%s", len(state['nuclear_sent']), len(state['major_sent']), ignored_count)
+    
+    log.info("[INFO] Run completed.")
+
+def run_daemon(state, interval, checkpoint_interval, trace=None, metrics=None, metrics_path=None):
+    """Poll every `interval` seconds with state kept in memory.
+
+    The daemon also wakes the moment a time window opens or closes, so
+    slot, digest and post-quiet-hours sends happen on time even with a
+    long interval. State is checkpointed to disk every `checkpoint_interval` seconds and
+    once more on SIGTERM/SIGINT, after the cycle in progress finishes.
+    
+    Metrics are written after every cycle; `metrics` (if given) is used for
+    the first cycle so it includes the initial state load.
+    """
+    stop = threading.Event()
     
-    # 30-day retention for sent items
-    sent_cutoff = current_time - datetime.timedelta(days=SENT_RETENTION_DAYS)
-    state['nuclear_sent'] = [x for x in state['nuclear_sent'] if datetime.datetime.fromisoformat(x['timestamp']) > sent_cutoff]
-    state['major_sent'] = [x for x in state['major_sent'] if datetime.datetime.fromisoformat(x['timestamp']) > sent_cutoff]
+    def request_stop(signum, frame):
+        log.info("\n[INFO] Received signal %s; stopping after the current cycle", signum)
+        stop.set()
     
-    # 14-day retention for digest
-    digest_cutoff = current_time - datetime.timedelta(days=DIGEST_RETENTION_DAYS)
-    state['digest_items'] = [x for x in state['digest_items'] if datetime.datetime.fromisoformat(x['timestamp']) > digest_cutoff]
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
     
-    # Cap ignored items at 5000
-    if len(state['ignored_items']) > IGNORED_ITEMS_CAP:
-        state['ignored_items'] = state['ignored_items'][-IGNORED_ITEMS_CAP:]
+    log.info("[INFO] Daemon mode: polling every %ss, checkpoint every %ss", interval, checkpoint_interval)
+    last_checkpoint = time.monotonic()
+    while not stop.is_set():
+        cycle_start = time.monotonic()
+        metrics = metrics or RunMetrics()
+        try:
+            run_cycle(state, trace, metrics)
+        except Exception as e:
+            log.error("[ERROR] Cycle failed: %s", e)
+        if trace:
+            trace.flush()
+        
+        if time.monotonic() - last_checkpoint >= checkpoint_interval:
+            with metrics.stage('save_state'):
+                save_state(state)
+            last_checkpoint = time.monotonic()
+            log.info("[INFO] State checkpointed")
+        metrics.record_state(state)
+        metrics.write(metrics_path)
+        metrics = None
+        
+        wait = interval - (time.monotonic() - cycle_start)
+        now = datetime.datetime.utcnow()
+        when, name, opens = next_transition(now)
+        until_transition = (when - now).total_seconds() + 1  # Land just inside the new minute
+        if until_transition < wait:
+            log.info("[INFO] Sleeping until %s %s at %s UTC", name, 'opens' if opens else 'closes', when.strftime('%H:%M'))
+            wait = until_transition
+        stop.wait(max(0.0, wait))
     
-    # Update sent_urls (30-day retention)
-    # For simplicity, rebuild from nuclear_sent + major_sent
-    state['sent_urls'] = list(set(
-        [x['url'] for x in state['nuclear_sent']] +
-        [x['url'] for x in state['major_sent']]
-    ))
+    save_state(state)
+    log.info("[INFO] State saved; daemon stopped.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score F1 news headlines and send push notifications")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Keep running and poll the feeds instead of doing a single run")
+    parser.add_argument("--interval", type=float, default=DAEMON_POLL_SECONDS,
+                        help="Seconds between polls in daemon mode")
+    parser.add_argument("--checkpoint", type=float, default=DAEMON_CHECKPOINT_SECONDS,
+                        help="Seconds between state checkpoints in daemon mode")
+    parser.add_argument("--trace", default=TRACE_FILE, metavar="PATH",
+                        help="Append a JSONL record per feed item (id, rules, score, decay, decision) to PATH")
+    parser.add_argument("--metrics", default=METRICS_FILE, metavar="PATH",
+                        help="Write per-stage timings and counters to PATH (.prom for Prometheus text format; off unless set)")
+    parser.add_argument("--log-level", default=LOG_LEVEL, type=str.upper,
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                        help="DEBUG adds per-item and per-rule lines")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
     
-    # Update title_fingerprints (keep last 200)
-    all_sent = state['nuclear_sent'] + state['major_sent']
-    all_sent.sort(key=lambda x: x['timestamp'], reverse=True)
-    state['title_fingerprints'] = [
-        create_title_fingerprint(x['title'], x['timestamp'])
-        for x in all_sent[:200]
-    ]
+    if DRY_RUN:
+        log.info("[INFO] *** DRY RUN MODE *** No notifications will be sent")
     
-    print(f"[INFO] Cleanup: nuclear_sent={len(state['nuclear_sent'])}, major_sent={len(state['major_sent'])}, ignored={len(state['ignored_items'])}")
+    # Initialize Firebase (the app itself is created on the first send)
+    if not DRY_RUN and not init_firebase():
+        log.critical("[CRITICAL] Firebase init failed. Exiting.")
+        return
     
-    # === SAVE STATE ===
+    metrics = RunMetrics()
+    with metrics.stage('state_load'):
+        state = load_state()
+    log.info("[INFO] State schema v%s", state.get('schema_version', 1))
     
-    save_state(state)
-    print("[INFO] Run completed.")
+    trace = RunTrace(args.trace)
+    try:
+        if args.daemon:
+            run_daemon(state, args.interval, args.checkpoint, trace, metrics, args.metrics)
+            return
+        
+        run_cycle(state, trace, metrics)
+        with metrics.stage('save_state'):
+            save_state(state)
+        metrics.record_state(state)
+        metrics.write(args.metrics)
+    finally:
+        trace.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,15 @@
+"""Temporary module-global overrides shared by the offline notification tools."""
+import contextlib
+
+
+@contextlib.contextmanager
+def patched(module, **attrs):
+    """Temporarily override module globals"""
+    saved = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
@@ -0,0 +1,288 @@
+"""Line-oriented, append-only storage for the notification state.
+
+The state directory holds one small meta.json for scalar fields and, for
+each list section, two JSONL files:
+
+    <section>.jsonl      compacted snapshot, one record per line, sorted
+    <section>.log.jsonl  changes since the last compaction, appended per run
+
+Log lines are {"put": record} or {"del": key}. A run only appends the
+records it added, changed or removed, so the git diff for a run is a few
+lines. Once a log grows past the size of its snapshot, the section is
+compacted back into a sorted snapshot and the log is emptied.
+
+Id-set sections (seen headline ids) are stored the same way but as a
+binary RingIdSet snapshot, <section>.bin, plus a log of hex ids.
+"""
+import json
+import os
+import struct
+import sys
+from array import array
+
+COMPACT_MIN_LINES = 200  # Never compact a log shorter than this
+ID_LOG_COMPACT_LINES = 2000  # Fold an id-set log into its blob past this many lines
+
+
+def canonical_json(value):
+    """Stable single-line JSON used for both storage and change detection"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def record_key(record):
+    """Identity of a record within its section"""
+    if isinstance(record, dict):
+        if 'id' in record:
+            return record['id']
+        return canonical_json(record)
+    return record
+
+
+class RingIdSet:
+    """Fixed-capacity set of 64-bit ids that forgets the oldest ids once full.
+
+    Ids live in an array('Q') ring in insertion order with a set alongside
+    for lookups. String ids (md5 hex digests) are reduced to their first
+    64 bits.
+    """
+    MAGIC = b'RID1'
+    HEADER = struct.Struct('<4sI')  # magic, count
+
+    def __init__(self, capacity, ids=()):
+        self.capacity = capacity
+        self._ring = array('Q')
+        self._head = 0  # Oldest entry once the ring is full
+        self._members = set()
+        self.pending = []  # Ids added since the set was last persisted
+        self.extend(ids)
+        self.pending = []
+
+    @staticmethod
+    def to_int(item_id):
+        if isinstance(item_id, int):
+            return item_id
+        return int(item_id[:16], 16)
+
+    def __contains__(self, item_id):
+        return self.to_int(item_id) in self._members
+
+    def __len__(self):
+        return len(self._ring)
+
+    def __iter__(self):
+        return iter(self.ordered())
+
+    def add(self, item_id):
+        value = self.to_int(item_id)
+        if value in self._members:
+            return
+        if len(self._ring) < self.capacity:
+            self._ring.append(value)
+        else:
+            self._members.discard(self._ring[self._head])
+            self._ring[self._head] = value
+            self._head = (self._head + 1) % self.capacity
+        self._members.add(value)
+        self.pending.append(value)
+
+    def extend(self, item_ids):
+        for item_id in item_ids:
+            self.add(item_id)
+
+    def ordered(self):
+        """Ids from oldest to newest"""
+        return self._ring[self._head:] + self._ring[:self._head]
+
+    def to_bytes(self):
+        ids = self.ordered()
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return self.HEADER.pack(self.MAGIC, len(ids)) + ids.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, capacity):
+        magic, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a RingIdSet blob")
+        ids = array('Q')
+        ids.frombytes(data[cls.HEADER.size:cls.HEADER.size + 8 * count])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        seen = cls(capacity)
+        seen._ring = ids[-capacity:]
+        seen._members = set(seen._ring)
+        return seen
+
+
+class JsonlStateStore:
+    """State directory made of a meta file plus snapshot/log pairs per section"""
+
+    def __init__(self, directory, sections, id_sets=None, compact_min_lines=COMPACT_MIN_LINES):
+        # sections: name -> sort key for the snapshot (None keeps list order)
+        # id_sets: name -> RingIdSet capacity
+        self.directory = directory
+        self.sections = dict(sections)
+        self.id_sets = dict(id_sets or {})
+        self.compact_min_lines = compact_min_lines
+        self._baseline = {}   # section -> {key: canonical line} as last read/written
+        self._log_lines = {}  # section -> lines currently in its log
+        self._meta_line = None
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def snapshot_path(self, section):
+        return os.path.join(self.directory, f"{section}.jsonl")
+
+    def log_path(self, section):
+        return os.path.join(self.directory, f"{section}.log.jsonl")
+
+    def blob_path(self, section):
+        return os.path.join(self.directory, f"{section}.bin")
+
+    def id_log_path(self, section):
+        return os.path.join(self.directory, f"{section}.log")
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def read_meta(self):
+        """Scalar fields (schema version, date, slot counters, ...)"""
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        self._meta_line = canonical_json(meta)
+        return meta
+
+    def read_section(self, section):
+        """Replay a section's snapshot and log (a list, or a RingIdSet for id sets)"""
+        if section in self.id_sets:
+            return self._read_id_set(section)
+        return self._read_records(section)
+
+    def _read_records(self, section):
+        records = {}
+        for path in (self.snapshot_path(section), self.log_path(section)):
+            if not os.path.exists(path):
+                continue
+            is_log = path.endswith('.log.jsonl')
+            log_lines = 0
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    if not is_log:
+                        records[record_key(entry)] = entry
+                        continue
+                    log_lines += 1
+                    if 'put' in entry:
+                        records[record_key(entry['put'])] = entry['put']
+                    else:
+                        records.pop(entry['del'], None)
+            if is_log:
+                self._log_lines[section] = log_lines
+
+        self._log_lines.setdefault(section, 0)
+        self._baseline[section] = {key: canonical_json(record) for key, record in records.items()}
+        return list(records.values())
+
+    def write(self, meta, sections):
+        """Persist meta and the given sections, appending only what changed"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        meta_line = canonical_json(meta)
+        if meta_line != self._meta_line:
+            self._atomic_write(self.meta_path, json.dumps(meta, indent=2, sort_keys=True) + "\n")
+            self._meta_line = meta_line
+
+        for section, records in sections.items():
+            self._write_section(section, records)
+
+    def _read_id_set(self, section):
+        capacity = self.id_sets[section]
+        if os.path.exists(self.blob_path(section)):
+            with open(self.blob_path(section), 'rb') as f:
+                seen = RingIdSet.from_bytes(f.read(), capacity)
+        else:
+            # Sections written before id sets had a blob were plain JSONL lists
+            seen = RingIdSet(capacity, self._read_records(section))
+
+        log_lines = 0
+        if os.path.exists(self.id_log_path(section)):
+            with open(self.id_log_path(section), 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        seen.add(int(line, 16))
+                        log_lines += 1
+        seen.pending = []
+        self._log_lines[section] = log_lines
+        return seen
+
+    def _write_id_set(self, section, seen):
+        if not isinstance(seen, RingIdSet):
+            seen = RingIdSet(self.id_sets[section], seen)
+            seen.pending = list(seen.ordered())
+
+        log_lines = self._log_lines.get(section, 0) + len(seen.pending)
+        if not os.path.exists(self.blob_path(section)) or log_lines > ID_LOG_COMPACT_LINES:
+            with open(self.blob_path(section) + ".tmp", 'wb') as f:
+                f.write(seen.to_bytes())
+            os.replace(self.blob_path(section) + ".tmp", self.blob_path(section))
+            self._atomic_write(self.id_log_path(section), "")
+            for legacy_path in (self.snapshot_path(section), self.log_path(section)):
+                if os.path.exists(legacy_path):
+                    os.remove(legacy_path)
+            log_lines = 0
+        elif seen.pending:
+            with open(self.id_log_path(section), 'a') as f:
+                f.write("".join(f"{value:016x}\n" for value in seen.pending))
+
+        seen.pending = []
+        self._log_lines[section] = log_lines
+
+    def _write_section(self, section, records):
+        if section in self.id_sets:
+            return self._write_id_set(section, records)
+        if section not in self._baseline:
+            self.read_section(section)
+        baseline = self._baseline[section]
+
+        current = {}
+        for record in records:
+            current.setdefault(record_key(record), (canonical_json(record), record))
+
+        changes = [
+            canonical_json({"put": record})
+            for key, (line, record) in current.items()
+            if baseline.get(key) != line
+        ]
+        changes.extend(canonical_json({"del": key}) for key in baseline if key not in current)
+
+        log_lines = self._log_lines.get(section, 0) + len(changes)
+        if not os.path.exists(self.snapshot_path(section)) or log_lines > max(self.compact_min_lines, len(current)):
+            self._compact(section, [record for _, record in current.values()])
+            log_lines = 0
+        elif changes:
+            with open(self.log_path(section), 'a', encoding='utf-8') as f:
+                f.write("".join(line + "\n" for line in changes))
+
+        self._baseline[section] = {key: line for key, (line, _) in current.items()}
+        self._log_lines[section] = log_lines
+
+    def _compact(self, section, records):
+        """Rewrite the snapshot from live records and empty the log"""
+        sort_key = self.sections.get(section)
+        if sort_key is not None:
+            records = sorted(records, key=sort_key)
+        self._atomic_write(self.snapshot_path(section), "".join(canonical_json(r) + "\n" for r in records))
+        self._atomic_write(self.log_path(section), "")
+
+    @staticmethod
+    def _atomic_write(path, content):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
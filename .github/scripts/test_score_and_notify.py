@@ -0,0 +1,136 @@
+"""Regression tests for score_and_notify.
+
+Run from the repository root:
+    python -m unittest discover -s .github/scripts -p "test_*.py"
+"""
+import datetime
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import score_and_notify as notifier
+
+NOW = datetime.datetime(2026, 3, 1, 12, 0)
+
+
+def headline(title, summary=""):
+    item = notifier.FeedItem(title=title, link="https://example.com/" + title.replace(" ", "-"), guid=None,
+                             pub_date_str=NOW.isoformat(), summary=summary, image_url=None, source="test")
+    return notifier.Headline(item, NOW, notifier.generate_id(title, item.pub_date_str))
+
+
+class NuclearValidatorTest(unittest.TestCase):
+
+    def test_calls_past_the_deadline_still_count(self):
+        release = threading.Event()
+
+        def slow_request(headlines):
+            release.wait(5)
+            return [notifier.guardrails_passed_verdict("late")] * len(headlines)
+
+        state = {'gemini_calls': 0, 'gemini_cache': []}
+        with mock.patch.object(notifier, 'GEMINI_API_KEY', 'test-key'), \
+                mock.patch.object(notifier, 'request_gemini_verdicts', side_effect=slow_request):
+            validator = notifier.NuclearValidator(state, NOW, deadline_seconds=0.05, batch_window=0)
+            validator.submit(headline("Lewis Hamilton signs with Ferrari"), "")
+            results = validator.results()
+            release.set()
+            validator._thread.join(5)
+
+        self.assertEqual(state['gemini_calls'], 1)
+        self.assertEqual(state['gemini_cache'], [])  # The late verdict is dropped
+        self.assertIn("deadline", results[0][1]['reason'])
+
+
+class OutboxExpiryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = {'outbox': [], 'nuclear_sent': [], 'major_sent': [], 'sent_urls': [],
+                      'title_fingerprints': [], 'ignored_items': [], 'nuclear_queue': [], 'digest_items': [],
+                      'date': NOW.strftime('%Y-%m-%d'), 'slot1_remaining': 1, 'slot2_remaining': 2,
+                      'digest_sent': False, 'schema_version': notifier.STATE_SCHEMA_VERSION}
+        self.sent = []
+
+    def failing_sink(self, fields):
+        return False
+
+    def recording_sink(self, fields):
+        self.sent.append(fields)
+        return True
+
+    def enqueue(self, kind, now, **kwargs):
+        item = headline("Max Verstappen disqualified from Monaco Grand Prix").to_record() if kind != 'digest' else None
+        notifier.enqueue_notification(self.state, kind, item, title="F1 News", body="body",
+                                      data={"type": kind}, now=now, **kwargs)
+        return item
+
+    def test_retry_within_max_age_is_delivered(self):
+        self.enqueue('nuclear', NOW)
+        notifier.drain_outbox(self.state, now=NOW, sink=self.failing_sink)
+        later = NOW + datetime.timedelta(seconds=notifier.OUTBOX_MAX_AGE_SECONDS - 60)
+        self.assertEqual(notifier.drain_outbox(self.state, now=later, sink=self.recording_sink), (1, 0))
+        self.assertEqual(len(self.state['nuclear_sent']), 1)
+
+    def test_stale_major_returns_to_the_digest_pool(self):
+        self.state['slot1_remaining'] = 0
+        item = self.enqueue('major', NOW, slot='slot1')
+        notifier.drain_outbox(self.state, now=NOW, sink=self.failing_sink)
+        later = NOW + datetime.timedelta(seconds=notifier.OUTBOX_MAX_AGE_SECONDS)
+        self.assertEqual(notifier.drain_outbox(self.state, now=later, sink=self.recording_sink), (0, 0))
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.state['outbox'], [])
+        self.assertEqual([x['id'] for x in self.state['digest_items']], [item['id']])
+        self.assertNotIn(item['id'], self.state['ignored_items'])
+        self.assertEqual(self.state['slot1_remaining'], 1)
+
+    def test_attempt_limit_is_reached_before_the_age_limit(self):
+        self.enqueue('major', NOW)
+        now = NOW
+        for _ in range(notifier.OUTBOX_MAX_ATTEMPTS):
+            notifier.drain_outbox(self.state, now=now, sink=self.failing_sink)
+            if self.state['outbox']:
+                now = datetime.datetime.utcfromtimestamp(self.state['outbox'][0]['next_retry'])
+        self.assertEqual(self.state['outbox'], [])
+        self.assertLess(now, NOW + datetime.timedelta(seconds=notifier.OUTBOX_MAX_AGE_SECONDS))
+        self.assertEqual(len(self.state['digest_items']), 1)
+
+    def test_nuclear_retry_in_quiet_hours_is_queued(self):
+        evening = NOW.replace(hour=19, minute=0)
+        item = self.enqueue('nuclear', evening)
+        notifier.drain_outbox(self.state, now=evening, sink=self.failing_sink)
+        quiet = evening + datetime.timedelta(hours=1)
+        self.assertEqual(notifier.drain_outbox(self.state, now=quiet, sink=self.recording_sink), (0, 0))
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.state['outbox'], [])
+        self.assertEqual([x['id'] for x in self.state['nuclear_queue']], [item['id']])
+
+    def test_digest_expires_when_its_window_closes(self):
+        opened = NOW.replace(hour=notifier.TIME_WINDOWS['digest'][0][0], minute=notifier.TIME_WINDOWS['digest'][0][1])
+        closed = NOW.replace(hour=notifier.TIME_WINDOWS['digest'][1][0], minute=notifier.TIME_WINDOWS['digest'][1][1])
+        self.enqueue('digest', opened)
+        notifier.drain_outbox(self.state, now=opened, sink=self.failing_sink)
+        self.assertEqual(notifier.drain_outbox(self.state, now=closed, sink=self.recording_sink), (0, 0))
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.state['outbox'], [])
+
+    def test_undelivered_digest_restores_its_items(self):
+        opened = NOW.replace(hour=notifier.TIME_WINDOWS['digest'][0][0], minute=notifier.TIME_WINDOWS['digest'][0][1])
+        closed = NOW.replace(hour=notifier.TIME_WINDOWS['digest'][1][0], minute=notifier.TIME_WINDOWS['digest'][1][1])
+        titles = ("Ferrari unveil new floor", "McLaren confirm driver line-up", "Pirelli pick softer tyres")
+        self.state['digest_items'] = [dict(headline(title).to_record(), score=50) for title in titles]
+        with mock.patch.object(notifier, 'DIGEST_COMBINED_THRESHOLD', 0):
+            self.assertTrue(notifier.send_digest(self.state, opened))
+        self.assertTrue(self.state['digest_sent'])
+        self.assertEqual(self.state['digest_items'], [])
+        notifier.drain_outbox(self.state, now=opened, sink=self.failing_sink)
+        notifier.drain_outbox(self.state, now=closed, sink=self.recording_sink)
+        self.assertEqual(self.sent, [])
+        self.assertFalse(self.state['digest_sent'])
+        self.assertEqual([x['title'] for x in self.state['digest_items']], list(titles))
+
+if __name__ == "__main__":
+    unittest.main()
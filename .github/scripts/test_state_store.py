@@ -0,0 +1,92 @@
+"""Round-trip tests for state_store.
+
+Run from the repository root:
+    python -m unittest discover -s .github/scripts -p "test_*.py"
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_store import JsonlStateStore, RingIdSet
+
+
+def record(record_id, score):
+    return {'id': record_id, 'title': f"Headline {record_id}", 'score': score}
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [line for line in f.read().splitlines() if line]
+
+
+class JsonlStateStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def store(self, compact_min_lines=200):
+        return JsonlStateStore(self.directory, {'items': lambda r: r['id']}, {'seen': 8}, compact_min_lines)
+
+    def test_log_replay_applies_puts_and_dels(self):
+        store = self.store()
+        store.write({'schema_version': 5}, {'items': [record('a', 1), record('b', 2), record('c', 3)]})
+        store.write({'schema_version': 5}, {'items': [record('a', 1), record('b', 20), record('d', 4)]})
+
+        log_lines = read_lines(store.log_path('items'))
+        self.assertEqual(len(log_lines), 3)  # put b, put d, del c
+        self.assertIn('{"del":"c"}', log_lines)
+
+        reread = self.store()
+        self.assertEqual(reread.read_meta(), {'schema_version': 5})
+        self.assertEqual(sorted(reread.read_section('items'), key=lambda r: r['id']),
+                         [record('a', 1), record('b', 20), record('d', 4)])
+
+    def test_unchanged_write_appends_nothing(self):
+        store = self.store()
+        store.write({}, {'items': [record('a', 1)]})
+        store.write({}, {'items': [record('a', 1)]})
+        self.assertEqual(read_lines(store.log_path('items')), [])
+
+    def test_long_log_is_compacted_into_a_sorted_snapshot(self):
+        store = self.store(compact_min_lines=2)
+        store.write({}, {'items': [record('b', 1), record('a', 1)]})
+        store.write({}, {'items': [record('b', 2), record('a', 2)]})
+        self.assertEqual(len(read_lines(store.log_path('items'))), 2)
+
+        store.write({}, {'items': [record('c', 3), record('b', 2)]})  # 4 log lines > 2: compact
+        self.assertEqual(read_lines(store.log_path('items')), [])
+        self.assertEqual(read_lines(store.snapshot_path('items')),
+                         ['{"id":"b","score":2,"title":"Headline b"}', '{"id":"c","score":3,"title":"Headline c"}'])
+        self.assertEqual(self.store().read_section('items'), [record('b', 2), record('c', 3)])
+
+    def test_id_set_round_trips_through_blob_and_hex_log(self):
+        store = self.store()
+        seen = RingIdSet(8, range(1, 6))
+        store.write({}, {'seen': seen})
+        self.assertTrue(os.path.exists(store.blob_path('seen')))
+
+        seen.extend([6, "0123456789abcdef" + "0" * 16])
+        store.write({}, {'seen': seen})
+        self.assertEqual(read_lines(store.id_log_path('seen')), ["0000000000000006", "0123456789abcdef"])
+
+        reread = self.store().read_section('seen')
+        self.assertEqual(list(reread), list(seen))
+        self.assertEqual(reread.pending, [])
+        self.assertIn("0123456789abcdef" + "f" * 16, reread)
+
+    def test_ring_forgets_oldest_ids_past_capacity(self):
+        seen = RingIdSet(3, [1, 2, 3, 4, 5])
+        self.assertEqual(list(seen), [3, 4, 5])
+        self.assertNotIn(1, seen)
+
+        restored = RingIdSet.from_bytes(seen.to_bytes(), 2)
+        self.assertEqual(list(restored), [4, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()